@@ -3,6 +3,7 @@ from pyecharts import options as opts
 from pyecharts.charts   import Bar, Pie 
 import pandas as pd 
 from streamlit_echarts import st_pyecharts  
+from mk import get_region_counts
 # 配置中文环境 
 def set_chinese(): 
     return opts.InitOpts( 
@@ -58,10 +59,11 @@ def main():
         st.stop()    # 阻止继续加载 
  
     if 'data' in st.session_state:  
-        data = st.session_state.data  
         st.title("  舆情地域分布") 
-        data['ip'] = data['ip'].fillna('未知') 
-        province_counts = data['ip'].value_counts() 
+        province_counts = get_region_counts()
+        if province_counts is None:
+            st.error("数据中没有名为 'ip' 的列。")
+            st.stop()
  
         # 移除双列布局 
         st.markdown("###   舆情地区分布柱状图") 
@@ -0,0 +1,96 @@
+"""主题数 / 聚类数自动选择
+
+在一组候选值上并行训练模型并打分，省去手动调滑块、每猜一次就重新训练的过程：
+- LDA：UMass 主题一致性（越高越好），同时给出困惑度（越低越好）；
+- KMeans：抽样计算轮廓系数（越高越好）。
+各候选在进程池中并发训练，特征矩阵通过进程初始化函数只传给每个工作进程一次，之后只读共享。
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import silhouette_score
+
+from topic_models import train_kmeans, train_lda
+
+# 工作进程数可通过环境变量 AUTOTUNE_WORKERS 调整
+AUTOTUNE_WORKERS = int(os.environ.get("AUTOTUNE_WORKERS", os.cpu_count() or 1))
+SILHOUETTE_SAMPLE = 3000  # 轮廓系数的抽样文档数
+COHERENCE_TOP_N = 10  # 计算一致性时每个主题取的关键词数
+
+METRICS = {
+    "lda": ("coherence", "UMass 一致性"),
+    "kmeans": ("silhouette", "轮廓系数"),
+}
+
+_X = None  # 工作进程中的 TF-IDF 矩阵
+_presence = None  # 工作进程中的文档 × 词 0/1 矩阵（CSC，便于按列取）
+
+
+def _init_worker(X, counts):
+    global _X, _presence
+    _X = X
+    _presence = (counts > 0).astype(np.float32).tocsc() if counts is not None else None
+
+
+def umass_coherence(components, presence, top_n=COHERENCE_TOP_N):
+    """各主题的 UMass 一致性：按关键词两两的文档共现计算 log((D(wi, wj) + 1) / D(wj))"""
+    scores = []
+    for topic in components:
+        top = topic.argsort()[::-1][:top_n]
+        columns = presence[:, top]
+        co_doc = (columns.T @ columns).toarray()
+        doc_freq = np.diag(co_doc)
+        score = 0.0
+        for i in range(1, len(top)):
+            for j in range(i):
+                score += np.log((co_doc[i, j] + 1) / max(doc_freq[j], 1))
+        scores.append(score)
+    return float(np.mean(scores))
+
+
+def _evaluate(method, n_components):
+    """训练一个候选并打分，返回 (候选值, 指标字典, 模型)"""
+    if method == "lda":
+        model = train_lda(_X, n_components)
+        scores = {
+            "coherence": umass_coherence(model.components_, _presence),
+            "perplexity": float(model.perplexity(_X)),
+        }
+    else:
+        model = train_kmeans(_X, n_components)
+        sample_size = min(SILHOUETTE_SAMPLE, _X.shape[0])
+        scores = {"silhouette": float(silhouette_score(_X, model.labels_, sample_size=sample_size,
+                                                        random_state=42))}
+    return n_components, scores, model
+
+
+def sweep(method, X, counts, candidates, workers=None):
+    """在候选值上训练并打分
+
+    X 为 TF-IDF 矩阵，counts 为同一词表的计数矩阵（LDA 计算一致性用）。
+    返回 (各候选得分的 DataFrame, 最优候选值, 最优模型)。
+    """
+    candidates = list(candidates)
+    workers = AUTOTUNE_WORKERS if workers is None else workers
+    workers = min(workers, len(candidates))
+    if workers <= 1:
+        _init_worker(X, counts)
+        try:
+            results = [_evaluate(method, n) for n in candidates]
+        finally:
+            _init_worker(None, None)
+    else:
+        # 使用 spawn 启动工作进程，避免在多线程的 Streamlit 进程中 fork
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(X, counts)) as pool:
+            results = list(pool.map(_evaluate, [method] * len(candidates), candidates))
+
+    metric = METRICS[method][0]
+    table = pd.DataFrame([{"n_components": n, **scores} for n, scores, _ in results])
+    best = int(table.loc[table[metric].idxmax(), "n_components"])
+    best_model = next(model for n, _, model in results if n == best)
+    return table, best, best_model
@@ -0,0 +1,275 @@
+"""热词与突发词检测
+
+以流的方式消费新到的评论（采集任务逐条写入，或已上传的数据集按发布时间回放），
+用固定大小的 Count-Min Sketch 统计词频，内存与数据量无关：
+- 滑动窗口：按时间桶各保存一份 sketch，窗口计数 = 各桶之和，过期的桶整体减去；
+- 基线：移出窗口的时间桶计数的指数加权平均（EWMA），同样以 sketch 形式保存，
+  即窗口之前的历史水平，窗口计数明显高于“基线 × 桶数”的词视为突发；
+- 候选词：只跟踪窗口计数最高、超出基线最多的各 TOP_K 个词，每批数据后整体重新估计。
+同一条评论中重复出现的词只计一次，避免单条刷屏内容造成假突发。
+"""
+import threading
+import time
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+SKETCH_WIDTH = 1 << 14
+SKETCH_DEPTH = 4
+BUCKET_SECONDS = 300  # 实时采集：每个时间桶 5 分钟
+WINDOW_BUCKETS = 12  # 滑动窗口包含的桶数
+EWMA_ALPHA = 0.1  # 基线的平滑系数
+TOP_K = 200  # 跟踪的候选词数
+MIN_COUNT = 5  # 窗口内至少出现的次数
+BURST_RATIO = 3.0  # 窗口计数至少为基线期望的倍数
+STOPWORDS_FILE = "stopwords.txt"
+
+
+def _hash_terms(terms):
+    return pd.util.hash_array(np.asarray(terms, dtype=object))
+
+
+class CountMinSketch:
+    """Count-Min Sketch：估计值只会偏大，误差随宽度增加而减小"""
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH, seed=42):
+        rng = np.random.default_rng(seed)
+        self.width = width
+        self.depth = depth
+        self._a = rng.integers(1, 2 ** 63, depth, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, depth, dtype=np.uint64)
+
+    def columns(self, hashes):
+        """各行的列号，形状为 (depth, n)"""
+        with np.errstate(over="ignore"):
+            mixed = hashes[None, :] * self._a[:, None] + self._b[:, None]
+        return ((mixed >> np.uint64(32)) % np.uint64(self.width)).astype(np.intp)
+
+    def table(self, columns, counts, dtype=np.int32):
+        """把一批 (列号, 次数) 累加为一张计数表"""
+        return np.stack([np.bincount(row, weights=counts, minlength=self.width)
+                         for row in columns]).astype(dtype)
+
+    @staticmethod
+    def estimate(table, columns):
+        return table[np.arange(columns.shape[0])[:, None], columns].min(axis=0)
+
+
+class BurstDetector:
+    """滑动窗口热词统计与突发检测（线程安全）"""
+
+    def __init__(self, bucket_seconds=BUCKET_SECONDS, window_buckets=WINDOW_BUCKETS,
+                 width=SKETCH_WIDTH, depth=SKETCH_DEPTH, alpha=EWMA_ALPHA, top_k=TOP_K,
+                 exclude=frozenset(), min_length=2):
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = window_buckets
+        self.alpha = alpha
+        self.top_k = top_k
+        self.exclude = frozenset(exclude)
+        self.min_length = min_length
+        self.sketch = CountMinSketch(width, depth)
+        self._buckets = np.zeros((window_buckets, depth, width), dtype=np.int32)
+        self._window = np.zeros((depth, width), dtype=np.int32)
+        self._baseline = np.zeros((depth, width), dtype=np.float32)
+        self._bucket_posts = np.zeros(window_buckets, dtype=np.int64)
+        self._current = None  # 最新时间桶编号
+        self._hot = {}  # 候选词 -> 哈希（按窗口计数）
+        self._rising = {}  # 候选词 -> 哈希（按超出基线的部分）
+        self._lock = threading.Lock()
+        self.posts = 0
+        self.late = 0  # 早于窗口、被丢弃的评论数
+        self.closed_buckets = 0  # 已推进的桶数
+
+    @property
+    def warming_up(self):
+        """基线还未积累满一个窗口的历史时，突发判断不可靠"""
+        return self.closed_buckets < 2 * self.window_buckets
+
+    @property
+    def window_posts(self):
+        return int(self._bucket_posts.sum())
+
+    def _advance(self, bucket):
+        """推进到 bucket：移出窗口的桶从窗口中减去并并入基线"""
+        if self._current is None:
+            self._current = bucket
+            return
+        gap = bucket - self._current
+        if gap <= 0:
+            return
+        if gap > self.window_buckets:
+            # 长时间没有数据：中间的空桶只让基线衰减
+            for step in range(self.window_buckets):
+                self._close(self._current + step)
+            self._baseline *= (1 - self.alpha) ** (gap - self.window_buckets)
+            self.closed_buckets += gap - self.window_buckets
+        else:
+            for step in range(gap):
+                self._close(self._current + step)
+        self._current = bucket
+
+    def _close(self, bucket):
+        """结束 bucket，为下一个桶腾出位置（其中是刚移出窗口的旧桶）"""
+        following = (bucket + 1) % self.window_buckets
+        expired = self._buckets[following]
+        self._baseline *= 1 - self.alpha
+        self._baseline += self.alpha * expired
+        self.closed_buckets += 1
+        self._window -= expired
+        expired[:] = 0
+        self._bucket_posts[following] = 0
+
+    def _add(self, bucket, token_lists):
+        """把同一时间桶内的评论计入窗口，返回本批出现的 (词, 哈希)"""
+        terms = pd.Series(list(chain.from_iterable(set(tokens) for tokens in token_lists)), dtype=object)
+        codes, uniques = pd.factorize(terms)
+        uniques = pd.Series(uniques, dtype=object)
+        keep = (uniques.str.len() >= self.min_length).values & ~uniques.isin(self.exclude).values
+        counts = np.bincount(codes, minlength=len(uniques))[keep]
+        uniques = uniques[keep].values
+        slot = bucket % self.window_buckets
+        self._bucket_posts[slot] += len(token_lists)
+        if len(uniques) == 0:
+            return uniques, np.array([], dtype=np.uint64)
+        hashes = _hash_terms(uniques)
+        table = self.sketch.table(self.sketch.columns(hashes), counts)
+        self._buckets[slot] += table
+        self._window += table
+        return uniques, hashes
+
+    def _estimate(self, hashes):
+        """窗口计数和基线期望（整个窗口内的期望次数）"""
+        columns = self.sketch.columns(hashes)
+        counts = CountMinSketch.estimate(self._window, columns).astype(np.float64)
+        expected = CountMinSketch.estimate(self._baseline, columns).astype(np.float64) * self.window_buckets
+        return counts, expected
+
+    def _track(self, terms, hashes):
+        """新出现的词与已跟踪的候选词一起重新估计，各保留前 top_k 个"""
+        for tracked, score in ((self._hot, lambda c, e: c), (self._rising, lambda c, e: c - e)):
+            merged = dict(tracked)
+            merged.update(zip(terms.tolist(), hashes.tolist()))
+            names = list(merged)
+            counts, expected = self._estimate(np.fromiter(merged.values(), dtype=np.uint64, count=len(names)))
+            values = score(counts, expected)
+            if len(names) > self.top_k:
+                top = np.argpartition(-values, self.top_k)[:self.top_k]
+            else:
+                top = np.arange(len(names))
+            tracked.clear()
+            tracked.update((names[i], merged[names[i]]) for i in top if counts[i] > 0)
+
+    def update(self, token_lists, timestamps=None):
+        """计入一批评论（分词结果），timestamps 为秒数，缺省为当前时间
+
+        同一批内的评论按时间排序后逐桶计入；早于滑动窗口的评论丢弃。返回计入的条数。
+        """
+        token_lists = list(token_lists)
+        if not token_lists:
+            return 0
+        if timestamps is None:
+            timestamps = np.full(len(token_lists), time.time())
+        buckets = (np.asarray(timestamps, dtype=np.float64) // self.bucket_seconds).astype(np.int64)
+        order = np.argsort(buckets, kind="stable")
+        added = 0
+        with self._lock:
+            bounds = np.flatnonzero(np.diff(buckets[order])) + 1
+            for group in np.split(order, bounds):
+                bucket = int(buckets[group[0]])
+                if self._current is not None and bucket <= self._current - self.window_buckets:
+                    self.late += len(group)
+                    continue
+                self._advance(bucket)
+                terms, hashes = self._add(bucket, [token_lists[i] for i in group])
+                self._track(terms, hashes)
+                added += len(group)
+            self.posts += added
+        return added
+
+    def _report(self, tracked):
+        names = list(tracked)
+        hashes = np.fromiter(tracked.values(), dtype=np.uint64, count=len(names))
+        counts, expected = self._estimate(hashes)
+        return pd.DataFrame({
+            "词": names,
+            "窗口次数": counts.astype(np.int64),
+            "基线期望": np.round(expected, 1),
+            "倍数": np.round(counts / (expected + 1), 2),
+            "得分": np.round((counts - expected) / np.sqrt(expected + 1), 2),
+        })
+
+    def hot_terms(self, n=20):
+        """滑动窗口内出现最多的词"""
+        with self._lock:
+            report = self._report(self._hot)
+        return report.sort_values("窗口次数", ascending=False, kind="stable").head(n).reset_index(drop=True)
+
+    def bursts(self, n=20, min_count=MIN_COUNT, ratio=BURST_RATIO):
+        """窗口计数明显高于基线的词（按偏离程度排序）"""
+        with self._lock:
+            report = self._report(self._rising)
+        flagged = (report["窗口次数"] >= min_count) & (report["窗口次数"] >= ratio * (report["基线期望"] + 1))
+        return report[flagged].sort_values("得分", ascending=False, kind="stable").head(n).reset_index(drop=True)
+
+
+def load_stopwords(path=STOPWORDS_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return set(f.read().splitlines())
+    except FileNotFoundError:
+        return {"的", "了", "是", "在"}
+
+
+def timestamps_of(values):
+    """时间列转为 Unix 秒（无法解析的为 NaN）"""
+    parsed = pd.to_datetime(pd.Series(values).reset_index(drop=True), errors="coerce")
+    seconds = (parsed - pd.Timestamp("1970-01-01")) / pd.Timedelta(seconds=1)
+    return seconds.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def replay_bucket_seconds(start, end):
+    """回放历史数据时按时间跨度选择桶大小：跨度一个月以上按天，否则按小时"""
+    return 86400 if end - start > 30 * 86400 else 3600
+
+
+def replay(token_lists, published, exclude=frozenset()):
+    """按发布时间回放一个数据集，返回检测器（发布时间无法解析的评论不计入）"""
+    seconds = timestamps_of(published)
+    valid = ~np.isnan(seconds)
+    if not valid.any():
+        return None
+    token_lists = [tokens for tokens, ok in zip(token_lists, valid) if ok]
+    seconds = seconds[valid]
+    detector = BurstDetector(bucket_seconds=replay_bucket_seconds(seconds.min(), seconds.max()),
+                             exclude=exclude)
+    detector.update(token_lists, seconds)
+    return detector
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_detector():
+    """进程内共享的实时检测器，采集任务写入、页面读取"""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = BurstDetector(exclude=load_stopwords())
+        return _detector
+
+
+def feed_rows(rows, detector=None):
+    """把采集到的数据行（需含 review，按 采集时间 计时）计入实时检测器"""
+    from segment import cut_jieba
+
+    rows = [row for row in rows if row.get("review")]
+    if not rows:
+        return 0
+    detector = detector or get_detector()
+    token_lists = [cut_jieba(row["review"]) for row in rows]
+    # 采集时间为本地时间，缺失时用同样口径的当前时间
+    seconds = timestamps_of([row.get("采集时间") for row in rows])
+    seconds = np.where(np.isnan(seconds), timestamps_of([pd.Timestamp.now()])[0], seconds)
+    return detector.update(token_lists, seconds)
@@ -0,0 +1,224 @@
+"""后台采集任务
+
+采集任务在 Streamlit 请求之外的后台线程中运行，页面只负责提交任务和轮询状态。
+任务状态（含断点页码）和已采集的数据增量写入 crawl_jobs/<任务id>/ 目录，
+浏览器刷新或会话超时不影响采集；进程重启后任务从最近的检查点继续。
+浏览器从会话池借出、任务结束后归还，多个任务之间复用已登录的会话。
+采集到的每条数据同时计入进程内的实时热词检测器（见 burst.py）。
+"""
+import datetime
+import json
+import os
+import threading
+import uuid
+
+from burst import feed_rows
+from crawler import weibo_crawler
+from dedup import DedupIndex
+from driver_pool import get_pool
+
+JOB_DIR = "crawl_jobs"
+STATE_FILE = "job.json"
+ROWS_FILE = "rows.jsonl"
+ACTIVE_STATUSES = ("queued", "running")
+
+_lock = threading.Lock()
+_threads = {}  # 任务id -> 后台线程
+_cancelled = set()
+
+
+def _now():
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _job_path(job_id, name):
+    return os.path.join(JOB_DIR, job_id, name)
+
+
+def _write_state(state):
+    """原子写入任务状态，避免中途崩溃留下半个文件"""
+    path = _job_path(state["id"], STATE_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_job(job_id):
+    with open(_job_path(job_id, STATE_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_jobs():
+    """列出所有任务（最新在前）"""
+    if not os.path.isdir(JOB_DIR):
+        return []
+    jobs = []
+    for job_id in os.listdir(JOB_DIR):
+        try:
+            jobs.append(load_job(job_id))
+        except (OSError, ValueError):
+            continue
+    return sorted(jobs, key=lambda job: job["created"], reverse=True)
+
+
+def _read_records(job_id):
+    """读取检查点中的 (去重键, 数据行)，跳过崩溃时写了一半的行"""
+    path = _job_path(job_id, ROWS_FILE)
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                records.append((record["key"], record["row"]))
+            except (ValueError, KeyError):
+                continue
+    return records
+
+
+def rows_path(job_id):
+    """任务数据文件（只追加写入，可增量读取）"""
+    return _job_path(job_id, ROWS_FILE)
+
+
+def submit_job(keyword, start_date, end_date, max_posts, skip_history=True, sessions=1,
+               engine="selenium"):
+    """创建采集任务并在后台启动，返回任务id
+
+    sessions 为并行使用的浏览器会话数（受会话池大小和空闲会话数限制），
+    engine 为搜索页引擎（见 crawler.ENGINES）。
+    """
+    job_id = datetime.datetime.now().strftime("%Y%m%d%H%M%S") + "_" + uuid.uuid4().hex[:6]
+    os.makedirs(os.path.join(JOB_DIR, job_id), exist_ok=True)
+    _write_state({
+        "id": job_id,
+        "keyword": keyword,
+        "start_date": start_date,
+        "end_date": end_date,
+        "max_posts": max_posts,
+        "skip_history": skip_history,
+        "sessions": sessions,
+        "engine": engine,
+        "status": "queued",
+        "resume_page": 1,
+        "pages": 0,
+        "collected": 0,
+        "skipped": 0,
+        "posts_per_minute": 0.0,
+        "parse_ms": {},
+        "error": None,
+        "created": _now(),
+        "updated": _now(),
+    })
+    _start(job_id)
+    return job_id
+
+
+def cancel_job(job_id):
+    """请求停止任务，当前页处理完后生效"""
+    _cancelled.add(job_id)
+    with _lock:
+        running = job_id in _threads and _threads[job_id].is_alive()
+    if not running:
+        state = load_job(job_id)
+        if state["status"] in ACTIVE_STATUSES:
+            state.update(status="cancelled", updated=_now())
+            _write_state(state)
+
+
+def resume_job(job_id):
+    """从检查点继续一个已停止或失败的任务"""
+    _cancelled.discard(job_id)
+    state = load_job(job_id)
+    if state["status"] not in ACTIVE_STATUSES:
+        state.update(status="queued", updated=_now())
+        _write_state(state)
+    _start(job_id)
+
+
+def resume_jobs():
+    """重启后恢复未完成的任务（可重复调用，已在运行的任务不会重复启动）"""
+    for state in list_jobs():
+        if state["status"] in ACTIVE_STATUSES:
+            _start(state["id"])
+
+
+def _start(job_id):
+    with _lock:
+        thread = _threads.get(job_id)
+        if thread is not None and thread.is_alive():
+            return
+        thread = threading.Thread(target=_run_job, args=(job_id,), name=f"crawl-{job_id}", daemon=True)
+        _threads[job_id] = thread
+        thread.start()
+
+
+def _run_job(job_id):
+    state = load_job(job_id)
+    records = _read_records(job_id)
+    keys = [key for key, _ in records]
+
+    # 检查点中已有的数据不再重复采集
+    dedup = DedupIndex(state["keyword"], skip_history=state["skip_history"])
+    dedup.extend(keys)
+    dedup.persist(keys)
+
+    remaining = state["max_posts"] - len(records)
+    if remaining <= 0:
+        state.update(status="done", collected=len(records), updated=_now())
+        _write_state(state)
+        return
+
+    state.update(status="running", error=None, updated=_now())
+    _write_state(state)
+
+    rows_lock = threading.Lock()
+    rows_file = open(_job_path(job_id, ROWS_FILE), "a", encoding="utf-8")
+
+    def on_row(key, row):
+        with rows_lock:
+            rows_file.write(json.dumps({"key": key, "row": row}, ensure_ascii=False) + "\n")
+            rows_file.flush()
+        feed_rows([row])  # 计入实时热词统计
+
+    pages_before = state["pages"]
+
+    def on_progress(stats):
+        # 断点页码只在该页之前的数据行都已落盘后推进
+        state.update(
+            resume_page=stats.resume_page,
+            pages=pages_before + stats.pages,
+            collected=len(records) + stats.completed,
+            skipped=stats.skipped,
+            posts_per_minute=round(stats.posts_per_minute, 1),
+            parse_ms={engine: round(ms, 1) for engine, ms in stats.parse_ms_per_page.items()},
+            updated=_now(),
+        )
+        _write_state(state)
+
+    try:
+        with get_pool().acquire_many(state.get("sessions", 1)) as drivers:
+            weibo_crawler(
+                driver=drivers,
+                keyword=state["keyword"],
+                start_date=state["start_date"],
+                end_date=state["end_date"],
+                max_posts=remaining,
+                start_page=state["resume_page"],
+                dedup=dedup,
+                on_row=on_row,
+                on_progress=on_progress,
+                should_stop=lambda: job_id in _cancelled,
+                engine=state.get("engine", "selenium"),
+            )
+        state["status"] = "cancelled" if job_id in _cancelled else "done"
+    except Exception as e:
+        print(f"采集任务 {job_id} 失败: {str(e)}")
+        state.update(status="failed", error=str(e))
+    finally:
+        rows_file.close()
+        _cancelled.discard(job_id)
+        state.update(updated=_now())
+        _write_state(state)
@@ -0,0 +1,528 @@
+"""微博采集核心逻辑
+
+采集按流水线进行：生产者（每个浏览器会话一个）逐页抓取并解析原始字段，
+经有界队列交给 IP 属地查询线程，再交给规范化线程整理成数据行。
+浏览器翻页与接口查询同时进行，采集速度可通过回调实时展示。
+多个浏览器会话并行时各自负责互不重叠的页码。
+搜索页可由浏览器渲染（selenium 引擎），也可直接请求 HTML 解析（html 引擎，见 html_engine.py）。
+"""
+import itertools
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from urllib.parse import quote
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+
+from ip_fetcher import IPFetcher, IP_API_WORKERS, UNKNOWN
+from dedup import DedupIndex
+
+SEARCH_URL = "https://s.weibo.com/weibo?q={}"
+MAX_PAGES = 50  # 微博搜索最多返回 50 页结果
+QUEUE_SIZE = 200  # 各阶段之间队列的容量，队列满时生产者等待
+PROGRESS_INTERVAL = 1.0  # 等待队列排空时的进度回调间隔（秒）
+PAGE_DELAY = (3, 5)  # 每次翻页的随机等待区间（秒）
+PAGE_LOAD_TIMEOUT = 15
+ENGINES = {"selenium": "浏览器渲染", "html": "HTML 直接解析（失败时回退浏览器）"}
+
+_STOP = object()
+
+def configure_chrome_options():
+    """配置Chrome浏览器选项"""
+    options = Options()
+    
+    # 基础配置
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-infobars")
+    options.add_argument("--disable-extensions")
+    
+    # 反爬虫规避设置
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
+    options.add_experimental_option("useAutomationExtension", False)
+    
+    # 用户代理池
+    user_agents = [
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36"
+    ]
+    options.add_argument(f"user-agent={random.choice(user_agents)}")
+    
+    # 性能优化
+    options.add_argument("--disable-images")
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.default_content_setting_values.notifications": 2,
+        "credentials_enable_service": False,
+        "profile.password_manager_enabled": False
+    })
+    
+    # 语言设置
+    options.add_argument("--lang=zh-CN")
+    options.add_argument("--accept-language=zh-CN,zh;q=0.9")
+    
+    return options
+
+@lru_cache(maxsize=1)
+def chromedriver_path():
+    """ChromeDriver 只在进程内下载/定位一次"""
+    from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
+
+def init_webdriver():
+    """初始化浏览器实例"""
+    try:
+        service = Service(executable_path=chromedriver_path())
+        options = configure_chrome_options()
+        driver = webdriver.Chrome(service=service, options=options)
+        return driver
+    except Exception as e:
+        print(f"浏览器初始化失败: {str(e)}")
+        raise RuntimeError("无法启动浏览器，请检查ChromeDriver配置")
+
+def load_cookies(driver):
+    """加载微博Cookie"""
+    cookies = [
+        {
+            "name": "SUB",
+            "value": "_2A25Kvql6DeRhGeFM7lQQ-SzEzz-IHXVptaSyrDV8PUNbmtAYLVaskW9NQN2BkAvhupcrROysKhyF-f1eCou5SZ7u",
+            "domain": ".weibo.com",
+            "path": "/",
+            "expires": datetime.now().timestamp() + 86400,
+            "httpOnly": True,
+            "secure": True
+        },
+        {
+            "name": "SUBP",
+            "value": "0033WrSXqPxfM725Ws9jqgMF55529P9D9WFEJijQVlllSysUmdzKHGR65JpX5KzhUgL.FoMESKqp1KzRShe2dJLoIp7LxKML1KBLBKnLxKqL1hnLBoMNeo-ceK.E1hB0",
+            "domain": ".weibo.com",
+            "path": "/",
+            "expires": datetime.now().timestamp() + 86400,
+            "httpOnly": True,
+            "secure": True
+        }
+    ]
+    
+    driver.get("https://weibo.com")
+    time.sleep(2)
+    
+    for cookie in cookies:
+        try:
+            formatted_cookie = {
+                'name': cookie['name'],
+                'value': cookie['value'],
+                'domain': ".weibo.com",
+                'path': '/',
+                'httpOnly': True,
+                'secure': True
+            }
+            driver.add_cookie(formatted_cookie)
+        except Exception as e:
+            print(f"添加Cookie失败: {cookie['name']} - {str(e)}")
+    
+    driver.refresh()
+    time.sleep(3)
+    return driver
+
+def extract_raw_post(post_element):
+    """从卡片元素中读取原始字段（不做转换，也不查询接口）"""
+    try:
+        # 基础信息
+        content = post_element.find_element(By.CSS_SELECTOR, '.txt').text.strip()
+        
+        # 发布时间与bid
+        time_element = post_element.find_element(By.CSS_SELECTOR, '.from a')
+        time_text = time_element.text.strip()
+        try:
+            href = time_element.get_attribute('href')
+            bid = href.split('/')[-1].split('?')[0]
+        except Exception as e:
+            print(f"获取bid失败: {str(e)}")
+            bid = None
+        
+        # 页面上的IP属地（接口查询失败时的回退值）
+        page_ip = UNKNOWN
+        try:
+            ip_element = post_element.find_element(By.XPATH, ".//span[contains(text(), 'IP属地')]")
+            page_ip = ip_element.text.split('：')[-1].strip()
+        except NoSuchElementException:
+            pass
+
+        # 互动数据
+        actions = [
+            post_element.find_element(By.CSS_SELECTOR, f'.card-act li:nth-child({i})').text
+            for i in (1, 2, 3)
+        ]
+        
+        # 用户信息
+        user_name = post_element.find_element(By.CSS_SELECTOR, '.name').text
+        
+        return {
+            "bid": bid,
+            "content": content,
+            "time_text": time_text,
+            "page_ip": page_ip,
+            "actions": actions,
+            "user_name": user_name,
+        }
+    except Exception as e:
+        print(f"解析异常: {str(e)}")
+        return None
+
+# 一次脚本调用读取整页所有卡片的字段，取代每条微博八次以上的 WebDriver 往返。
+# 选择器与 extract_raw_post 一一对应；缺少必需元素的卡片返回 null。
+EXTRACT_CARDS_JS = """
+const text = el => (el.innerText || '').trim();
+const one = (root, selector) => root.querySelector(selector);
+return Array.from(document.querySelectorAll('.card-wrap')).map(card => {
+    const content = one(card, '.txt');
+    const time = one(card, '.from a');
+    const name = one(card, '.name');
+    const actions = [1, 2, 3].map(i => one(card, `.card-act li:nth-child(${i})`));
+    if (!content || !time || !name || actions.some(a => !a)) {
+        return null;
+    }
+    const ip = document.evaluate(".//span[contains(text(), 'IP属地')]", card, null,
+                                 XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    return {
+        content: text(content),
+        time_text: text(time),
+        href: time.href || null,
+        ip_text: ip ? text(ip) : null,
+        actions: actions.map(text),
+        user_name: text(name)
+    };
+});
+"""
+
+def extract_raw_posts(driver):
+    """在浏览器中一次性读取当前页所有卡片的原始字段（无法解析的卡片为 None）"""
+    raws = []
+    for card in driver.execute_script(EXTRACT_CARDS_JS) or []:
+        if card is None:
+            raws.append(None)
+            continue
+        href = card["href"]
+        raws.append({
+            "bid": href.split('/')[-1].split('?')[0] if href else None,
+            "content": card["content"],
+            "time_text": card["time_text"],
+            "page_ip": card["ip_text"].split('：')[-1].strip() if card["ip_text"] else UNKNOWN,
+            "actions": card["actions"],
+            "user_name": card["user_name"],
+        })
+    return raws
+
+def normalize_post(raw, ip_location):
+    """把原始字段整理为输出数据行"""
+    repost, comment, like = raw["actions"]
+    return {
+        "bid": raw["bid"],
+        "review": raw["content"],
+        "发布时间": parse_time(raw["time_text"]),
+        "ip": ip_location,
+        "转发数": extract_count(repost),
+        "评论数": extract_count(comment),
+        "点赞数": extract_count(like),
+        "用户名": raw["user_name"],
+        "采集时间": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+class SeleniumEngine:
+    """浏览器渲染搜索页，每页用一次脚本调用读取所有卡片的字段"""
+    name = "selenium"
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.last_engine = self.name
+        self.last_parse_seconds = 0.0
+
+    def read_page(self, url):
+        """返回该页各卡片的原始字段（解析失败的卡片为 None）；页面加载超时返回 None"""
+        self.driver.get(url)
+        time.sleep(random.uniform(*PAGE_DELAY))
+        try:
+            WebDriverWait(self.driver, PAGE_LOAD_TIMEOUT).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, ".card-wrap"))
+            )
+        except TimeoutException:
+            return None
+        started = time.perf_counter()
+        try:
+            raws = extract_raw_posts(self.driver)
+        except WebDriverException as e:
+            # 脚本执行失败时退回逐元素读取
+            print(f"批量解析失败，改为逐条解析: {str(e)}")
+            posts = self.driver.find_elements(By.CSS_SELECTOR, ".card-wrap")
+            raws = [extract_raw_post(post) for post in posts]
+        self.last_parse_seconds = time.perf_counter() - started
+        return raws
+
+    def close(self):
+        pass
+
+def create_engine(name, driver):
+    """按名称创建搜索页引擎，driver 为已登录的浏览器"""
+    if name == "html":
+        from html_engine import HTMLEngine
+        return HTMLEngine.from_driver(driver)
+    return SeleniumEngine(driver)
+
+class CrawlStats:
+    """采集进度统计（各阶段线程共同更新）
+
+    同时记录每页尚未处理完的微博数和各生产者的当前页，用于计算断点续采的起始页。
+    """
+
+    def __init__(self, start_page=1, max_posts=None):
+        self.started = time.monotonic()
+        self.start_page = start_page
+        self.max_posts = max_posts
+        self.pages = 0
+        self.produced = 0
+        self.completed = 0
+        self.skipped = 0
+        self.parse_timings = {}  # 引擎名 -> [页数, 解析耗时秒数]
+        self._cursors = {}  # 生产者编号 -> 正在抓取（或下一个要抓取）的页码
+        self._pending = {}  # 页码 -> 已产出但尚未处理完的微博数
+        self._lock = threading.Lock()
+
+    def add(self, name, value=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def record_parse(self, engine, seconds):
+        with self._lock:
+            timing = self.parse_timings.setdefault(engine, [0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+
+    @property
+    def parse_ms_per_page(self):
+        """各引擎平均每页解析耗时（毫秒），不含网络和页面加载时间"""
+        with self._lock:
+            return {engine: seconds / pages * 1000
+                    for engine, (pages, seconds) in self.parse_timings.items() if pages}
+
+    def set_cursor(self, producer, page):
+        with self._lock:
+            self._cursors[producer] = page
+
+    @property
+    def full(self):
+        return self.max_posts is not None and self.produced >= self.max_posts
+
+    def reserve(self, page):
+        """登记一条待处理的微博；已达到采集上限时返回 False"""
+        with self._lock:
+            if self.max_posts is not None and self.produced >= self.max_posts:
+                return False
+            self._pending[page] = self._pending.get(page, 0) + 1
+            self.produced += 1
+            return True
+
+    def item_done(self, page):
+        with self._lock:
+            self._pending[page] -= 1
+            if not self._pending[page]:
+                del self._pending[page]
+
+    @property
+    def resume_page(self):
+        """断点续采的起始页：此页之前产出的微博都已处理完"""
+        with self._lock:
+            pages = list(self._pending) + list(self._cursors.values())
+            return min(pages, default=self.start_page)
+
+    @property
+    def posts_per_minute(self):
+        elapsed = time.monotonic() - self.started
+        return self.completed / elapsed * 60 if elapsed > 0 else 0.0
+
+def _enrich_worker(fetcher, raw_queue, enriched_queue):
+    """IP 属地查询阶段：接口结果优先，失败时保留页面上的值"""
+    while True:
+        item = raw_queue.get()
+        if item is _STOP:
+            break
+        order, raw = item
+        ip_location = raw["page_ip"]
+        if fetcher is not None and raw["bid"]:
+            try:
+                fetched = fetcher.fetch(raw["bid"])
+                if fetched != UNKNOWN:
+                    ip_location = fetched
+            except Exception as e:
+                print(f"IP属地查询异常: {str(e)}")
+        enriched_queue.put((order, raw, ip_location))
+
+def _normalize_worker(enriched_queue, results, stats, on_row):
+    """规范化阶段：整理字段并按采集顺序收集结果（附带去重键）"""
+    while True:
+        item = enriched_queue.get()
+        if item is _STOP:
+            break
+        order, raw, ip_location = item
+        try:
+            row = normalize_post(raw, ip_location)
+            if on_row is not None:
+                on_row(raw["key"], row)
+            results.append((order, raw["key"], row))
+            stats.add("completed")
+        except Exception as e:
+            print(f"数据整理异常: {str(e)}")
+        finally:
+            stats.item_done(raw["page"])
+
+def produce_posts(engine, search_url, pages, emit, stats, dedup, producer=0, should_stop=None):
+    """生产者：按给定页码逐页抓取搜索结果，把未采集过的微博原始字段逐条交给 emit"""
+    page = None
+    try:
+        for page in pages:
+            if stats.full:
+                break
+            if should_stop is not None and should_stop():
+                print("采集已取消")
+                break
+            stats.set_cursor(producer, page)
+            current_url = f"{search_url}&page={page}"
+            raws = engine.read_page(current_url)
+            if raws is None:
+                print(f"页面 {page} 加载超时")
+                continue
+            stats.record_parse(engine.last_engine, engine.last_parse_seconds)
+            if not raws:
+                print("无更多内容")
+                break
+            
+            for raw in raws:
+                if raw is None:
+                    continue
+                # 重复或以往采集过的微博在这里跳过，不再查询 IP 属地
+                raw["key"] = dedup.add(raw)
+                if raw["key"] is None:
+                    stats.add("skipped")
+                    continue
+                raw["page"] = page
+                if not stats.reserve(page):
+                    break
+                emit(raw)
+            
+            stats.add("pages")
+        else:
+            # 所有页码均已处理完
+            if page is not None:
+                stats.set_cursor(producer, MAX_PAGES + 1)
+    except Exception as e:
+        print(f"爬取异常: {str(e)}")
+
+def _wait_threads(threads, stats, on_progress):
+    """等待线程结束，期间按固定间隔回调进度"""
+    for thread in threads:
+        while thread.is_alive():
+            thread.join(PROGRESS_INTERVAL)
+            if on_progress is not None:
+                on_progress(stats)
+
+def weibo_crawler(driver, keyword, start_date, end_date, max_posts,
+                  fetcher=None, workers=IP_API_WORKERS, on_progress=None, skip_history=True,
+                  start_page=1, dedup=None, on_row=None, should_stop=None, engine="selenium"):
+    """核心爬取逻辑（流水线）
+
+    driver 可以是单个浏览器，也可以是浏览器列表；多个会话时第 i 个会话
+    抓取 start_page + i, start_page + i + n, ... 这些互不重叠的页码。
+    engine 为搜索页引擎名称（见 ENGINES），html 引擎请求失败时回退到同一浏览器。
+    on_progress(stats) 在采集过程中按固定间隔于当前线程调用，可以直接更新 Streamlit 元素。
+    skip_history 为 True 时跳过该关键词以往采集过的微博（传入 dedup 时以 dedup 为准）。
+    断点续采相关：start_page 为起始页；on_row(key, row) 在每条数据处理完时
+    于规范化线程中调用；should_stop() 返回 True 时在下一页之前停止。
+    """
+    drivers = list(driver) if isinstance(driver, (list, tuple)) else [driver]
+    if dedup is None:
+        dedup = DedupIndex(keyword, skip_history=skip_history)
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        # Cookie 和 User-Agent 只从浏览器取一次
+        try:
+            fetcher = IPFetcher.from_driver(drivers[0], workers=workers)
+        except Exception as e:
+            print(f"获取Cookies失败: {str(e)}")
+
+    search_url = SEARCH_URL.format(quote(keyword)) + f"&timescope=custom:{start_date}:{end_date}"
+    stats = CrawlStats(start_page, max_posts)
+    raw_queue = queue.Queue(maxsize=QUEUE_SIZE)
+    enriched_queue = queue.Queue(maxsize=QUEUE_SIZE)
+    results = []
+    enrichers = [
+        threading.Thread(target=_enrich_worker, args=(fetcher, raw_queue, enriched_queue), daemon=True)
+        for _ in range(workers)
+    ]
+    normalizer = threading.Thread(target=_normalize_worker,
+                                  args=(enriched_queue, results, stats, on_row), daemon=True)
+    # 结果按 (页码, 产出顺序) 排序，多会话并行时也保持翻页顺序
+    sequence = itertools.count()
+    emit = lambda raw: raw_queue.put(((raw["page"], next(sequence)), raw))
+    engines = [create_engine(engine, d) for d in drivers]
+    producers = [
+        threading.Thread(target=produce_posts,
+                         args=(e, search_url, range(start_page + i, MAX_PAGES + 1, len(engines)),
+                               emit, stats, dedup, i, should_stop),
+                         daemon=True)
+        for i, e in enumerate(engines)
+    ]
+    for thread in enrichers + [normalizer] + producers:
+        thread.start()
+
+    try:
+        _wait_threads(producers, stats, on_progress)
+    finally:
+        for _ in enrichers:
+            raw_queue.put(_STOP)
+        _wait_threads(enrichers, stats, on_progress)
+        enriched_queue.put(_STOP)
+        normalizer.join()
+        for e in engines:
+            e.close()
+        if own_fetcher and fetcher is not None:
+            fetcher.close()
+
+    results.sort(key=lambda item: item[0])
+    dedup.persist([key for _, key, _ in results])
+    if on_progress is not None:
+        on_progress(stats)
+    return [row for _, _, row in results]
+
+def parse_time(time_str):
+    """处理时间格式"""
+    now = datetime.now()
+    if "刚刚" in time_str:
+        return now.strftime("%Y-%m-%d %H:%M")
+    elif "分钟前" in time_str:
+        mins = int(time_str.replace("分钟前", ""))
+        return (now - timedelta(minutes=mins)).strftime("%Y-%m-%d %H:%M")
+    elif "今天" in time_str:
+        return now.strftime(f"%Y-%m-%d {time_str.split()[-1]}")
+    elif "-" in time_str:
+        return f"{now.year}-{time_str}"
+    else:
+        return time_str
+
+def extract_count(text):
+    """提取互动数量"""
+    try:
+        return int(''.join(filter(str.isdigit, text)))
+    except:
+        return 0
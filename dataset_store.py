@@ -0,0 +1,121 @@
+"""列式数据集存储
+
+上传的数据只解析一次，转存为 Arrow IPC（Feather V2，不压缩）文件，
+并登记到 upload_history.db 的 uploads 表。之后按列内存映射读取，
+重新打开历史数据集无需再次上传和解析 CSV。
+"""
+import datetime
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import pyarrow.feather as feather
+
+from provinces import normalize_regions
+
+UPLOAD_DB = "upload_history.db"
+DATASET_DIR = "datasets"
+
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(UPLOAD_DB, timeout=30)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def init_db():
+    """建表，并为旧版 uploads 表补充数据集路径与行数列"""
+    with _connect() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS uploads
+                 (id INTEGER PRIMARY KEY,
+                  filename TEXT,
+                  upload_time TIMESTAMP,
+                  file_size INTEGER)''')
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(uploads)")}
+        if "path" not in existing:
+            conn.execute("ALTER TABLE uploads ADD COLUMN path TEXT")
+        if "row_count" not in existing:
+            conn.execute("ALTER TABLE uploads ADD COLUMN row_count INTEGER")
+
+
+def save_dataset(data, filename, file_size=None):
+    """把 DataFrame 转存为列式文件并登记，返回数据集 id"""
+    init_db()
+    os.makedirs(DATASET_DIR, exist_ok=True)
+    with _connect() as conn:
+        cursor = conn.execute(
+            "INSERT INTO uploads (filename, upload_time, file_size) VALUES (?, ?, ?)",
+            (filename, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), file_size))
+        dataset_id = cursor.lastrowid
+
+    path = os.path.join(DATASET_DIR, f"{dataset_id}.arrow")
+    tmp_path = path + ".tmp"
+    # 不压缩才能按列内存映射、零拷贝读取
+    feather.write_feather(data.reset_index(drop=True), tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+    with _connect() as conn:
+        conn.execute("UPDATE uploads SET path = ?, row_count = ? WHERE id = ?",
+                     (path, len(data), dataset_id))
+    return dataset_id
+
+
+def list_datasets(limit=20):
+    """列出可重新打开的历史数据集（最新在前）"""
+    init_db()
+    with _connect() as conn:
+        rows = conn.execute(
+            """SELECT id, filename, upload_time, file_size, row_count, path FROM uploads
+               WHERE path IS NOT NULL ORDER BY id DESC LIMIT ?""", (limit,)).fetchall()
+    return [
+        {"id": row[0], "文件名": row[1], "上传时间": row[2], "文件大小": row[3], "行数": row[4]}
+        for row in rows if os.path.exists(row[5])
+    ]
+
+
+def _dataset_path(dataset_id):
+    with _connect() as conn:
+        row = conn.execute("SELECT path FROM uploads WHERE id = ?", (dataset_id,)).fetchone()
+    if row is None or row[0] is None or not os.path.exists(row[0]):
+        raise FileNotFoundError(f"数据集 {dataset_id} 不存在")
+    return row[0]
+
+
+class DatasetRef:
+    """会话中代表已落盘数据集的轻量标记，只记录 id、行数和列名，不持有数据
+
+    页面通过 mk.get_data 按列读取，数据本身由进程内按列缓存共享。
+    """
+
+    def __init__(self, dataset_id, rows, columns):
+        self.dataset_id = dataset_id
+        self.rows = rows
+        self.columns = list(columns)
+
+    def __len__(self):
+        return self.rows
+
+
+def dataset_ref(dataset_id):
+    """为已保存的数据集生成会话标记（内存映射只读表结构，不加载数据）"""
+    table = feather.read_table(_dataset_path(dataset_id), memory_map=True)
+    return DatasetRef(dataset_id, table.num_rows, table.column_names)
+
+
+def load_dataset(dataset_id, columns=None):
+    """内存映射读取数据集，columns 为空时读取全部列，不存在的列自动忽略
+
+    早期保存的数据集 ip 列未规范化，读取时补做（已规范化时不产生开销）。
+    """
+    path = _dataset_path(dataset_id)
+    table = feather.read_table(path, memory_map=True)
+    if columns is not None:
+        table = table.select([col for col in columns if col in table.column_names])
+    data = table.to_pandas()
+    if "ip" in data:
+        data["ip"] = normalize_regions(data["ip"])
+    return data
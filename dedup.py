@@ -0,0 +1,79 @@
+"""采集去重索引
+
+以 bid 为键（缺少 bid 时退回内容指纹），用集合做 O(1) 判重，
+并按关键词持久化到 SQLite：重复采集同一关键词时直接跳过以往采集过的微博，
+也省掉这些微博的 IP 属地接口调用。
+"""
+import datetime
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+SEEN_DB = "crawl_seen.db"
+
+
+def post_key(raw):
+    """微博去重键：优先使用 bid，否则使用正文、发布时间和用户名的指纹"""
+    if raw.get("bid"):
+        return f"bid:{raw['bid']}"
+    fingerprint = "\x1f".join(str(raw.get(field, "")) for field in ("content", "time_text", "user_name"))
+    return "fp:" + hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+
+
+class DedupIndex:
+    """单个关键词的去重索引
+
+    skip_history=False 时只在本次采集内去重，但采集结果仍会记入历史。
+    """
+
+    def __init__(self, keyword, path=SEEN_DB, skip_history=True):
+        self.keyword = keyword
+        self.path = path
+        self.skipped = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS seen
+                            (keyword TEXT NOT NULL,
+                             key TEXT NOT NULL,
+                             first_seen TIMESTAMP,
+                             PRIMARY KEY (keyword, key))""")
+            if skip_history:
+                self._seen = {row[0] for row in conn.execute(
+                    "SELECT key FROM seen WHERE keyword = ?", (keyword,))}
+            else:
+                self._seen = set()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def __len__(self):
+        return len(self._seen)
+
+    def add(self, raw):
+        """登记一条微博，返回其去重键；已见过时返回 None"""
+        key = post_key(raw)
+        with self._lock:
+            if key in self._seen:
+                self.skipped += 1
+                return None
+            self._seen.add(key)
+        return key
+
+    def extend(self, keys):
+        """登记已确认采集过的去重键（如断点续采时检查点里已有的数据）"""
+        with self._lock:
+            self._seen.update(key for key in keys if key)
+
+    def persist(self, keys):
+        """把已成功采集的微博写入历史，之后的采集会跳过它们"""
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._connect() as conn:
+            conn.executemany("INSERT OR IGNORE INTO seen VALUES (?, ?, ?)",
+                             [(self.keyword, key, now) for key in keys if key])
@@ -0,0 +1,179 @@
+"""浏览器会话池
+
+启动 Chrome 并注入登录 Cookie 每次要花十几秒，这里把已登录的浏览器会话
+保留在进程内复用：采集任务从池中借出会话，结束后归还，而不是每次新建再退出。
+借出前做健康检查，登录失效时重新注入 Cookie，会话过旧或已崩溃时重建。
+"""
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+
+from crawler import init_webdriver, load_cookies
+from ip_fetcher import forget_identity
+
+POOL_SIZE = 3
+SESSION_MAX_AGE = 2 * 60 * 60  # 会话最长使用时间（秒），超过后重建以释放浏览器内存
+LOGIN_COOKIE = "SUB"  # 微博登录态 Cookie
+
+
+class _Session:
+    def __init__(self, driver):
+        self.driver = driver
+        self.created = time.monotonic()
+
+
+def _quit(driver):
+    try:
+        driver.quit()
+    except Exception as e:
+        print(f"关闭浏览器失败: {str(e)}")
+
+
+def new_logged_in_driver():
+    """新建浏览器并注入登录 Cookie"""
+    driver = init_webdriver()
+    try:
+        load_cookies(driver)
+    except Exception:
+        _quit(driver)
+        raise
+    return driver
+
+
+class DriverPool:
+    """最多 size 个已登录浏览器会话的复用池（线程安全）"""
+
+    def __init__(self, size=POOL_SIZE, factory=new_logged_in_driver, max_age=SESSION_MAX_AGE):
+        self.size = size
+        self.factory = factory
+        self.max_age = max_age
+        self._idle = []
+        self._busy = {}  # id(driver) -> _Session
+        self._count = 0  # 已创建（含正在创建）的会话数
+        self._cond = threading.Condition()
+
+    def _healthy(self, session):
+        """会话可用则返回 True；登录态丢失时尝试重新注入 Cookie"""
+        if time.monotonic() - session.created > self.max_age:
+            return False
+        try:
+            session.driver.execute_script("return 1")
+            if session.driver.get_cookie(LOGIN_COOKIE) is None:
+                load_cookies(session.driver)
+                forget_identity(session.driver)
+            return True
+        except Exception as e:
+            print(f"浏览器会话不可用，将重建: {str(e)}")
+            return False
+
+    def _discard(self, driver):
+        with self._cond:
+            self._count -= 1
+            self._cond.notify()
+        _quit(driver)
+
+    def acquire(self, block=True):
+        """借出一个已登录的浏览器；block=False 且无可用会话时返回 None"""
+        while True:
+            session = None
+            with self._cond:
+                while not self._idle and self._count >= self.size:
+                    if not block:
+                        return None
+                    self._cond.wait()
+                if self._idle:
+                    session = self._idle.pop()
+                else:
+                    # 先占名额，浏览器在锁外创建
+                    self._count += 1
+
+            if session is None:
+                try:
+                    session = _Session(self.factory())
+                except Exception:
+                    with self._cond:
+                        self._count -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._healthy(session):
+                self._discard(session.driver)
+                continue
+
+            with self._cond:
+                self._busy[id(session.driver)] = session
+            return session.driver
+
+    def release(self, driver, broken=False):
+        """归还浏览器；broken=True 表示会话已损坏，直接关闭"""
+        with self._cond:
+            session = self._busy.pop(id(driver), None)
+            if session is not None and not broken:
+                self._idle.append(session)
+                self._cond.notify()
+                return
+        if session is not None:
+            self._discard(driver)
+        else:
+            _quit(driver)
+
+    @contextmanager
+    def session(self):
+        """with pool.session() as driver: ...（出现异常时关闭该会话）"""
+        driver = self.acquire()
+        try:
+            yield driver
+        except Exception:
+            self.release(driver, broken=True)
+            raise
+        self.release(driver)
+
+    @contextmanager
+    def acquire_many(self, count):
+        """借出最多 count 个会话：至少等到一个，其余只取当前可用的，避免多个任务互相等待"""
+        drivers = [self.acquire()]
+        try:
+            while len(drivers) < min(count, self.size):
+                driver = self.acquire(block=False)
+                if driver is None:
+                    break
+                drivers.append(driver)
+        except Exception:
+            for driver in drivers:
+                self.release(driver)
+            raise
+        try:
+            yield drivers
+        except Exception:
+            for driver in drivers:
+                self.release(driver, broken=True)
+            raise
+        for driver in drivers:
+            self.release(driver)
+
+    def stats(self):
+        with self._cond:
+            return {"idle": len(self._idle), "busy": len(self._busy), "size": self.size}
+
+    def close_all(self):
+        """关闭所有空闲会话（借出中的会话在归还时不受影响）"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._count -= len(idle)
+            self._cond.notify_all()
+        for session in idle:
+            _quit(session.driver)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """进程内共享的会话池"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool()
+            atexit.register(_pool.close_all)
+        return _pool
@@ -0,0 +1,83 @@
+"""聚类分布图的二维嵌入
+
+不再把整个 TF-IDF 矩阵转为稠密数组做 t-SNE：
+先按聚类分层抽样（每个聚类最多 cap 篇），再用 TruncatedSVD 在稀疏矩阵上降到几十维，
+最后只对抽样点做 t-SNE。散点数据以列式数组交给 ECharts，不再为每个点构造字典。
+"""
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.manifold import TSNE
+
+SVD_COMPONENTS = 50
+SAMPLE_PER_CLUSTER = 500
+MIN_POINTS = 10  # 少于该点数时不做嵌入
+
+
+def cluster_color(label, num_clusters):
+    return f"hsl({(label * 360) // num_clusters}, 60%, 60%)"
+
+
+def stratified_sample(labels, cap=SAMPLE_PER_CLUSTER, random_state=42):
+    """每个聚类最多随机抽取 cap 个文档，返回排好序的行号"""
+    rng = np.random.default_rng(random_state)
+    picked = []
+    for label in np.unique(labels):
+        rows = np.flatnonzero(labels == label)
+        if rows.size > cap:
+            rows = rng.choice(rows, cap, replace=False)
+        picked.append(rows)
+    return np.sort(np.concatenate(picked))
+
+
+def reduce_dimensions(X, n_components=SVD_COMPONENTS, random_state=42):
+    """稀疏矩阵用 TruncatedSVD 降维；特征数本来就不多时直接转为稠密数组"""
+    if X.shape[1] <= n_components + 1 or X.shape[0] <= n_components + 1:
+        return X.toarray()
+    svd = TruncatedSVD(n_components=n_components, random_state=random_state)
+    return svd.fit_transform(X)
+
+
+def embed_clusters(X, labels, cap=SAMPLE_PER_CLUSTER, random_state=42):
+    """抽样 + SVD + t-SNE，返回 (抽样行号, float32 二维坐标)；点数过少时返回 None"""
+    rows = stratified_sample(labels, cap, random_state)
+    if rows.size <= MIN_POINTS:
+        return None
+    reduced = reduce_dimensions(X[rows], random_state=random_state)
+    tsne = TSNE(n_components=2, perplexity=min(30.0, rows.size - 1.0), random_state=random_state)
+    return rows, tsne.fit_transform(reduced).astype(np.float32)
+
+
+def scatter_option(coords, labels, num_clusters, title="t-SNE 聚类分布图"):
+    """列式 dataset 的散点图配置，颜色按聚类编号分段映射"""
+    return {
+        "title": {"text": title},
+        "dataset": {
+            "dimensions": ["x", "y", "cluster"],
+            "source": {
+                "x": np.round(coords[:, 0], 3).tolist(),
+                "y": np.round(coords[:, 1], 3).tolist(),
+                "cluster": labels.astype(int).tolist(),
+            },
+        },
+        "xAxis": {"type": "value"},
+        "yAxis": {"type": "value"},
+        "tooltip": {"trigger": "item"},
+        "visualMap": {
+            "type": "piecewise",
+            "dimension": 2,
+            "orient": "horizontal",
+            "top": "bottom",
+            "pieces": [
+                {"value": label, "label": f"聚类 {label + 1}", "color": cluster_color(label, num_clusters)}
+                for label in range(num_clusters)
+            ],
+        },
+        "grid": {"bottom": 60},
+        "series": [{
+            "type": "scatter",
+            "encode": {"x": "x", "y": "y", "tooltip": ["cluster"]},
+            "itemStyle": {"opacity": 0.6},
+            "symbolSize": 6 if len(coords) > 5000 else 10,
+            "progressive": 5000,
+        }],
+    }
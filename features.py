@@ -0,0 +1,77 @@
+"""共享特征矩阵
+
+每个数据集只统计一次词频（文档 × 词的稀疏计数矩阵）。不同 max_df / min_df 下的
+特征视图只需按文档频率筛选列，TF-IDF 权重也直接由计数矩阵算出，
+结果与 TfidfVectorizer(max_df=..., min_df=...) 完全一致，无需重新分词和计数。
+LDA、KMeans 以及参数调整共用同一份矩阵。
+"""
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+from sklearn.preprocessing import normalize
+
+MAX_VIEWS = 8  # 每个数据集缓存的 TF-IDF 视图数
+
+
+def _doc_count(value, n_docs):
+    """max_df / min_df 为浮点数时按文档比例计算（与 CountVectorizer 一致）"""
+    return value if isinstance(value, (int, np.integer)) else value * n_docs
+
+
+class FeatureStore:
+    """单个数据集的词频矩阵及其派生视图
+
+    processed 为空格分隔的分词文本（Series）。
+    """
+
+    def __init__(self, processed):
+        processed = processed.reset_index(drop=True)
+        vectorizer = CountVectorizer(dtype=np.int32)
+        self.counts = vectorizer.fit_transform(processed).tocsr()
+        self.vocabulary = vectorizer.get_feature_names_out()
+        self.doc_freq = np.bincount(self.counts.indices, minlength=self.counts.shape[1])
+        self.doc_hashes = pd.util.hash_pandas_object(processed, index=False).values
+        self._vocab_index = pd.Index(self.vocabulary)
+        self._views = {}
+
+    @property
+    def n_docs(self):
+        return self.counts.shape[0]
+
+    def columns(self, max_df=1.0, min_df=1):
+        """满足文档频率条件的列号"""
+        max_count = _doc_count(max_df, self.n_docs)
+        min_count = _doc_count(min_df, self.n_docs)
+        if max_count < min_count:
+            raise ValueError("max_df corresponds to < documents than min_df")
+        columns = np.flatnonzero((self.doc_freq <= max_count) & (self.doc_freq >= min_count))
+        if columns.size == 0:
+            raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+        return columns
+
+    def count_view(self, max_df=1.0, min_df=1):
+        """筛选后的计数矩阵和对应的词表"""
+        columns = self.columns(max_df, min_df)
+        return self.counts[:, columns], self.vocabulary[columns]
+
+    def tfidf(self, max_df=0.95, min_df=2):
+        """TF-IDF 矩阵（float32）、词表和 idf，等价于 TfidfVectorizer(max_df, min_df)"""
+        key = (max_df, min_df)
+        if key not in self._views:
+            counts, features = self.count_view(max_df, min_df)
+            transformer = TfidfTransformer()
+            X = transformer.fit_transform(counts).astype(np.float32)
+            if len(self._views) >= MAX_VIEWS:
+                self._views.pop(next(iter(self._views)))
+            self._views[key] = (X, features, transformer.idf_)
+        return self._views[key]
+
+    def project(self, features, idf, rows=None):
+        """按给定词表和 idf（如已保存的模型）计算 TF-IDF，本数据集没有的词记为 0"""
+        positions = self._vocab_index.get_indexer(features)
+        present = positions >= 0
+        counts = self.counts if rows is None else self.counts[rows]
+        projected = counts[:, np.where(present, positions, 0)]
+        projected = projected.multiply(present.astype(np.int32)).tocsr()
+        X = normalize(projected.multiply(idf).tocsr(), norm="l2", copy=False)
+        return X.astype(np.float32)
@@ -0,0 +1,187 @@
+"""搜索页 HTML 直接解析引擎
+
+不经浏览器渲染，直接用带登录 Cookie 的连接池请求搜索页 HTML，
+再用 lxml 一次性解析所有 .card-wrap 卡片，省掉每条微博多次 WebDriver 往返。
+输出的原始字段与 crawler.extract_raw_post 相同；请求失败、被重定向到登录页
+或页面中没有卡片时回退到浏览器引擎。
+"""
+import random
+import time
+
+import requests
+from lxml import html as lxml_html
+from requests.adapters import HTTPAdapter
+
+from selenium.webdriver.common.by import By
+
+from crawler import PAGE_DELAY, SeleniumEngine, extract_raw_post
+from ip_fetcher import UNKNOWN, browser_identity
+
+HTML_TIMEOUT = 15
+
+
+def _has_class(name):
+    """等价于 CSS 类选择器 .name 的 XPath 条件"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+CARD_XPATH = f"//*[{_has_class('card-wrap')}]"
+TEXT_XPATH = f".//*[{_has_class('txt')}]"
+TIME_XPATH = f".//*[{_has_class('from')}]//a"
+IP_XPATH = ".//span[contains(text(), 'IP属地')]"
+ACTION_XPATH = f".//*[{_has_class('card-act')}]//li[count(preceding-sibling::*) = {{}}]"
+NAME_XPATH = f".//*[{_has_class('name')}]"
+
+
+def _text(element):
+    """近似 Selenium 的 element.text：<br> 换行，其余空白（含源码中的换行）合并为一个空格，去掉空行"""
+    lines = [[]]
+    for node in element.xpath(".//text() | .//br"):
+        if isinstance(node, str):
+            lines[-1].append(node)
+        else:
+            lines.append([])
+    lines = (" ".join("".join(parts).split()) for parts in lines)
+    return "\n".join(line for line in lines if line)
+
+
+def _first(card, xpath):
+    found = card.xpath(xpath)
+    if not found:
+        raise ValueError(f"未找到元素: {xpath}")
+    return found[0]
+
+
+def parse_card(card):
+    """解析单个卡片，字段与 crawler.extract_raw_post 一致；缺少必需元素时返回 None"""
+    try:
+        content = _text(_first(card, TEXT_XPATH))
+
+        time_element = _first(card, TIME_XPATH)
+        time_text = _text(time_element)
+        href = time_element.get("href")
+        bid = href.split('/')[-1].split('?')[0] if href else None
+
+        page_ip = UNKNOWN
+        ip_elements = card.xpath(IP_XPATH)
+        if ip_elements:
+            page_ip = _text(ip_elements[0]).split('：')[-1].strip()
+
+        actions = [_text(_first(card, ACTION_XPATH.format(i))) for i in (0, 1, 2)]
+        user_name = _text(_first(card, NAME_XPATH))
+
+        return {
+            "bid": bid,
+            "content": content,
+            "time_text": time_text,
+            "page_ip": page_ip,
+            "actions": actions,
+            "user_name": user_name,
+        }
+    except Exception as e:
+        print(f"解析异常: {str(e)}")
+        return None
+
+
+def parse_search_page(page_html):
+    """解析整页搜索结果，返回各卡片的原始字段（解析失败的卡片为 None）"""
+    tree = lxml_html.fromstring(page_html)
+    return [parse_card(card) for card in tree.xpath(CARD_XPATH)]
+
+
+class HTMLEngine:
+    """直接请求并解析搜索页 HTML，必要时回退到 fallback 引擎"""
+    name = "html"
+
+    def __init__(self, cookies, user_agent, fallback=None, timeout=HTML_TIMEOUT):
+        self.fallback = fallback
+        self.timeout = timeout
+        self.last_engine = self.name
+        self.last_parse_seconds = 0.0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            'User-Agent': user_agent,
+            'Referer': 'https://s.weibo.com/',
+            'Accept-Language': 'zh-CN,zh;q=0.9'
+        })
+        self.session.cookies.update(cookies)
+
+    @classmethod
+    def from_driver(cls, driver, **kwargs):
+        """沿用浏览器会话的 Cookie 和 User-Agent，并以该浏览器作为回退"""
+        cookies, user_agent = browser_identity(driver)
+        return cls(cookies, user_agent, fallback=SeleniumEngine(driver), **kwargs)
+
+    def fetch(self, url):
+        """请求搜索页，失败或被重定向到登录页时返回 None"""
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            print(f"搜索页请求失败: {str(e)}")
+            return None
+        if response.status_code != 200 or "passport" in response.url:
+            print(f"搜索页请求失败: HTTP {response.status_code} {response.url}")
+            return None
+        return response.text
+
+    def read_page(self, url):
+        """返回该页各卡片的原始字段；页面无法获取时返回 None"""
+        time.sleep(random.uniform(*PAGE_DELAY))
+        page_html = self.fetch(url)
+        if page_html is not None:
+            started = time.perf_counter()
+            raws = parse_search_page(page_html)
+            self.last_parse_seconds = time.perf_counter() - started
+            if raws:
+                self.last_engine = self.name
+                return raws
+
+        # 没有卡片可能是真的没有结果，也可能是访客验证页，交给浏览器确认
+        if self.fallback is None:
+            return None if page_html is None else []
+        raws = self.fallback.read_page(url)
+        self.last_engine = self.fallback.last_engine
+        self.last_parse_seconds = self.fallback.last_parse_seconds
+        return raws
+
+    def close(self):
+        self.session.close()
+
+
+def compare_engines(driver, url):
+    """同一搜索页分别用浏览器（整页脚本 / 逐元素读取）和 HTML 解析，比较解析耗时和字段一致性
+
+    返回各方式的卡片数、解析耗时（毫秒）以及 HTML 解析与浏览器字段不一致的微博（按 bid 对齐）。
+    """
+    selenium_engine = SeleniumEngine(driver)
+    selenium_raws = selenium_engine.read_page(url) or []
+    started = time.perf_counter()
+    element_raws = [extract_raw_post(post) for post in driver.find_elements(By.CSS_SELECTOR, ".card-wrap")]
+    element_seconds = time.perf_counter() - started
+    # 解析浏览器当前渲染的同一份页面，排除两次请求结果不同的干扰
+    page_html = driver.page_source
+    started = time.perf_counter()
+    html_raws = parse_search_page(page_html)
+    html_seconds = time.perf_counter() - started
+
+    by_bid = {raw["bid"]: raw for raw in html_raws if raw is not None}
+    mismatches = []
+    for raw in selenium_raws:
+        if raw is None:
+            continue
+        other = by_bid.get(raw["bid"])
+        fields = [field for field in raw if other is None or other[field] != raw[field]]
+        if fields:
+            mismatches.append({"bid": raw["bid"], "fields": fields})
+    return {
+        "selenium": {"cards": sum(raw is not None for raw in selenium_raws),
+                     "parse_ms": selenium_engine.last_parse_seconds * 1000},
+        "elements": {"cards": sum(raw is not None for raw in element_raws),
+                     "parse_ms": element_seconds * 1000},
+        "html": {"cards": len(by_bid), "parse_ms": html_seconds * 1000},
+        "mismatches": mismatches,
+    }
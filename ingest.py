@@ -0,0 +1,91 @@
+"""CSV 分块读取
+
+只读取分析所需的列，逐块压缩数据类型（ip 规范化为地区简称 category、互动数降为小整数），
+并在累计内存超出预算时中止读取，避免大文件撑爆 Streamlit 进程。
+"""
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from provinces import UNKNOWN as UNKNOWN_IP, normalize_regions
+
+NEEDED_COLUMNS = ["review", "ip", "发布时间", "转发数", "评论数", "点赞数"]
+COUNT_COLUMNS = ["转发数", "评论数", "点赞数"]
+CHUNK_SIZE = 50_000
+MEMORY_BUDGET_MB = 1024
+
+
+class MemoryBudgetExceeded(MemoryError):
+    """读取的数据超过内存预算"""
+
+
+def _compact_counts(series):
+    """互动数：非数字按 0 处理（与爬虫 extract_count 一致），并降为最小整数类型"""
+    counts = pd.to_numeric(series, errors="coerce").fillna(0).astype("int64")
+    return pd.to_numeric(counts, downcast="integer")
+
+
+def compact_chunk(chunk):
+    """压缩单个数据块的数据类型"""
+    if "ip" in chunk:
+        chunk["ip"] = normalize_regions(chunk["ip"])
+    for col in COUNT_COLUMNS:
+        if col in chunk:
+            chunk[col] = _compact_counts(chunk[col])
+    return chunk
+
+
+def _file_size(file):
+    size = getattr(file, "size", None)
+    if size is None and hasattr(file, "seek"):
+        position = file.tell()
+        size = file.seek(0, 2)
+        file.seek(position)
+    return size
+
+
+def read_csv_chunked(file, columns=NEEDED_COLUMNS, chunksize=CHUNK_SIZE,
+                     memory_budget_mb=MEMORY_BUDGET_MB, on_progress=None):
+    """分块读取 CSV 并返回压缩后的 DataFrame
+
+    on_progress(fraction, rows) 在每个数据块读取后回调，fraction 为已读字节比例。
+    超出 memory_budget_mb 时抛出 MemoryBudgetExceeded。
+    """
+    wanted = set(columns)
+    budget = memory_budget_mb * 1024 * 1024
+    total_size = _file_size(file)
+
+    chunks = []
+    used = 0
+    rows = 0
+    reader = pd.read_csv(file, usecols=lambda col: col in wanted, chunksize=chunksize)
+    for chunk in reader:
+        if "review" not in chunk.columns:
+            raise ValueError("CSV 文件中缺少 review 列")
+        chunk = compact_chunk(chunk)
+        used += int(chunk.memory_usage(deep=True).sum())
+        rows += len(chunk)
+        if used > budget:
+            raise MemoryBudgetExceeded(
+                f"已读取 {rows} 行，占用内存超过预算 {memory_budget_mb} MB")
+        chunks.append(chunk)
+        if on_progress is not None:
+            fraction = min(file.tell() / total_size, 1.0) if total_size else 0.0
+            on_progress(fraction, rows)
+
+    if not chunks:
+        return pd.DataFrame()
+
+    # 单独合并 ip 的类别后再拼接，避免退化为 object 列
+    ip_parts = [chunk.pop("ip") for chunk in chunks if "ip" in chunk]
+    data = pd.concat(chunks, ignore_index=True)
+    if ip_parts:
+        ip = union_categoricals(ip_parts, ignore_order=True)
+        if UNKNOWN_IP not in ip.categories:
+            ip = ip.add_categories([UNKNOWN_IP])
+        data["ip"] = pd.Categorical(ip)
+    for col in COUNT_COLUMNS:
+        if col in data:
+            data[col] = pd.to_numeric(data[col], downcast="integer")
+    if on_progress is not None:
+        on_progress(1.0, rows)
+    return data[[col for col in columns if col in data.columns]]
@@ -0,0 +1,129 @@
+"""微博 IP 属地并发查询
+
+采集流水线的多个补全线程共用一个连接池化的 requests.Session 并发请求微博接口，
+用令牌桶做全局限速（取代每次请求前的随机休眠），失败时指数退避重试。
+接口地址可配置，便于用本地桩服务器测试。
+"""
+import random
+import threading
+import time
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_URL = "https://weibo.com/ajax/statuses/show"
+API_RETRY = 3
+IP_API_TIMEOUT = 10
+IP_API_RATE = 2.0  # 全局每秒请求数
+IP_API_BURST = 4  # 令牌桶容量（允许的瞬时并发请求数）
+IP_API_WORKERS = 8
+BACKOFF_BASE = 1.0  # 首次重试等待秒数，之后逐次翻倍
+BACKOFF_MAX = 30.0
+UNKNOWN = "未知"
+DELETED = "已删除"
+
+_identities = weakref.WeakKeyDictionary()  # 浏览器 -> (Cookie, User-Agent)
+_identities_lock = threading.Lock()
+
+
+class TokenBucket:
+    """线程安全的令牌桶：按 rate 匀速补充令牌，最多积累 capacity 个"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，令牌不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def backoff_delay(attempt):
+    """指数退避等待时间（带随机抖动）"""
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def browser_identity(driver):
+    """浏览器会话的 Cookie 和 User-Agent，每个会话只向浏览器读取一次"""
+    with _identities_lock:
+        identity = _identities.get(driver)
+    if identity is None:
+        cookies = {c['name']: c['value'] for c in driver.get_cookies()}
+        user_agent = driver.execute_script("return navigator.userAgent;")
+        identity = (cookies, user_agent)
+        with _identities_lock:
+            _identities[driver] = identity
+    return identity
+
+
+def forget_identity(driver):
+    """会话重新登录后清除缓存的 Cookie"""
+    with _identities_lock:
+        _identities.pop(driver, None)
+
+
+class IPFetcher:
+    """批量查询微博 IP 属地"""
+
+    def __init__(self, cookies, user_agent, api_url=API_URL, rate=IP_API_RATE,
+                 burst=IP_API_BURST, workers=IP_API_WORKERS, retries=API_RETRY,
+                 timeout=IP_API_TIMEOUT):
+        self.api_url = api_url
+        self.workers = workers
+        self.retries = retries
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            'User-Agent': user_agent,
+            'Referer': 'https://weibo.com/',
+            'X-Requested-With': 'XMLHttpRequest'
+        })
+        self.session.cookies.update(cookies)
+
+    @classmethod
+    def from_driver(cls, driver, **kwargs):
+        """沿用已登录浏览器会话的 Cookie 和 User-Agent"""
+        cookies, user_agent = browser_identity(driver)
+        return cls(cookies, user_agent, **kwargs)
+
+    def fetch(self, bid):
+        """查询单条微博的 IP 属地"""
+        for attempt in range(self.retries):
+            self.bucket.acquire()
+            try:
+                response = self.session.get(self.api_url, params={"id": bid}, timeout=self.timeout)
+                if response.status_code == 200:
+                    region = response.json().get("region_name", "")
+                    return region.split()[-1] if region else UNKNOWN
+                elif response.status_code == 404:
+                    return DELETED
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                print(f"API请求失败（尝试{attempt+1}/{self.retries}）: {str(e)}")
+            except (KeyError, AttributeError) as e:
+                print(f"JSON解析失败: {str(e)}")
+                return UNKNOWN
+            if attempt < self.retries - 1:
+                time.sleep(backoff_delay(attempt))
+        return UNKNOWN
+
+    def close(self):
+        self.session.close()
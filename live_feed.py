@@ -0,0 +1,230 @@
+"""实时数据视图
+
+数据源是只追加的文件：采集任务的 rows.jsonl，或监听目录中陆续写入的 JSONL / CSV 文件。
+每次刷新只读取上次位置之后新写入的完整行，新数据以块的形式追加到内存表中
+（相邻的小块逐级合并，块数保持在对数级别），不再重新读取和拼接全部数据。
+筛选、排序和分页都在服务端完成，浏览器每次只收到当前一页：
+- 关键词筛选结果按行缓存，新数据到达时只对新增行做匹配；
+- 排序结果按行数缓存，数据不变时翻页不再重新排序。
+"""
+import glob
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+PAGE_SIZE = 50
+REFRESH_SECONDS = 3
+WATCH_DIR = "incoming"  # 监听目录：外部程序把 JSONL / CSV 文件写入这里
+SEARCH_COLUMN = "review"
+MAX_CACHED_QUERIES = 4
+
+
+def _read_new_lines(path, offset):
+    """读取 offset 之后新写入的完整行，返回 (字节内容, 新的位置)；写了一半的行留到下次"""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return b"", offset
+    if size <= offset:
+        return b"", offset
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(size - offset)
+    end = data.rfind(b"\n") + 1
+    return data[:end], offset + end
+
+
+class JsonlTail:
+    """增量读取 JSONL 文件，支持采集任务的 {"key", "row"} 格式和普通的一行一条记录"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+
+    def poll(self):
+        data, self.offset = _read_new_lines(self.path, self.offset)
+        rows = []
+        for line in data.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            row = record.get("row", record) if isinstance(record, dict) else None
+            if isinstance(row, dict):
+                rows.append(row)
+        return pd.DataFrame(rows) if rows else None
+
+
+class CsvTail:
+    """增量读取 CSV 文件，第一行为表头"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.header = None
+
+    def poll(self):
+        data, offset = _read_new_lines(self.path, self.offset)
+        if not data:
+            return None
+        text = data.decode("utf-8-sig", errors="replace")
+        header = self.header
+        if header is None:
+            header, _, text = text.partition("\n")
+        frame = None
+        if text.strip():
+            try:
+                # 列数不对的行直接跳过，其余读取失败时不推进位置，下次重新读取
+                frame = pd.read_csv(io.StringIO(header + "\n" + text), on_bad_lines="skip")
+            except (ValueError, pd.errors.ParserError) as e:
+                print(f"读取 {self.path} 失败: {str(e)}")
+                return None
+        self.header, self.offset = header, offset
+        return frame
+
+
+class DirectoryWatch:
+    """监听目录：新出现的文件从头读取，已有的文件只读新增部分"""
+
+    def __init__(self, directory=WATCH_DIR):
+        self.directory = directory
+        self._tails = {}
+
+    def poll(self):
+        mtimes = {}
+        for path in (glob.glob(os.path.join(self.directory, "*.jsonl"))
+                     + glob.glob(os.path.join(self.directory, "*.csv"))):
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except OSError:
+                continue  # 列出目录后文件已被删除或轮转
+        for gone in set(self._tails) - set(mtimes):
+            del self._tails[gone]  # 同名文件再次出现时从头读取
+        frames = []
+        for path in sorted(mtimes, key=mtimes.get):
+            tail = self._tails.get(path)
+            if tail is None:
+                tail = JsonlTail(path) if path.endswith(".jsonl") else CsvTail(path)
+                self._tails[path] = tail
+            frame = tail.poll()
+            if frame is not None:
+                frames.append(frame)
+        return pd.concat(frames, ignore_index=True) if frames else None
+
+
+class LiveTable:
+    """只追加的数据表，支持增量拉取和服务端筛选、排序、分页
+
+    source 为带 poll() 方法的数据源（返回新增数据的 DataFrame 或 None）；
+    frame 为初始数据（静态数据集只用它，不需要 source）。
+    """
+
+    def __init__(self, source=None, frame=None):
+        self.source = source
+        self.rows = 0
+        self._chunks = []
+        self._masks = {}  # 关键词 -> (已匹配行数, 匹配结果)
+        self._orders = {}  # (列, 升序) -> (行数, 排序后的行号)
+        if frame is not None and not frame.empty:
+            self._append(frame.reset_index(drop=True))
+
+    @property
+    def columns(self):
+        return list(dict.fromkeys(col for chunk in self._chunks for col in chunk.columns))
+
+    def poll(self):
+        """拉取数据源的新增数据，返回新增行数"""
+        if self.source is None:
+            return 0
+        frame = self.source.poll()
+        if frame is None or frame.empty:
+            return 0
+        self._append(frame)
+        return len(frame)
+
+    def _append(self, frame):
+        self._chunks.append(frame.reset_index(drop=True))
+        self.rows += len(frame)
+        # 像二进制计数器一样合并：最后一块不小于前一块时合并，块数保持在 O(log n)
+        while len(self._chunks) > 1 and len(self._chunks[-1]) >= len(self._chunks[-2]):
+            last = self._chunks.pop()
+            self._chunks[-1] = pd.concat([self._chunks[-1], last], ignore_index=True)
+
+    def _bounds(self):
+        return np.cumsum([0] + [len(chunk) for chunk in self._chunks])
+
+    def _column(self, name, start=0):
+        """第 start 行之后的某一列（缺少该列的块记为空值）"""
+        bounds = self._bounds()
+        parts = []
+        for chunk, chunk_start in zip(self._chunks, bounds[:-1]):
+            if chunk_start + len(chunk) <= start:
+                continue
+            part = chunk[name] if name in chunk else pd.Series([None] * len(chunk), dtype=object)
+            parts.append(part.iloc[max(start - chunk_start, 0):])
+        if not parts:
+            return pd.Series([], dtype=object)
+        return pd.concat(parts, ignore_index=True)
+
+    def take(self, positions):
+        """按行号取出若干行（保持给定顺序），索引为行号"""
+        positions = np.asarray(positions, dtype=np.int64)
+        if positions.size == 0:
+            return pd.DataFrame(columns=self.columns)
+        bounds = self._bounds()
+        which = np.searchsorted(bounds, positions, side="right") - 1
+        parts = []
+        for i in np.unique(which):
+            picked = positions[which == i]
+            part = self._chunks[i].iloc[picked - bounds[i]]
+            parts.append(part.set_axis(picked))
+        return pd.concat(parts).reindex(positions)[self.columns]
+
+    def _match(self, keyword):
+        """各行是否包含关键词，只对上次之后的新增行做匹配"""
+        matched, mask = self._masks.pop(keyword, (0, np.zeros(0, dtype=bool)))
+        if matched < self.rows:
+            text = self._column(SEARCH_COLUMN, matched).astype(str)
+            mask = np.concatenate([mask, text.str.contains(keyword, regex=False, na=False).values])
+        self._masks[keyword] = (self.rows, mask)
+        while len(self._masks) > MAX_CACHED_QUERIES:
+            self._masks.pop(next(iter(self._masks)))
+        return mask
+
+    def _order(self, column, ascending):
+        key = (column, ascending)
+        cached = self._orders.get(key)
+        if cached is None or cached[0] != self.rows:
+            values = self._column(column)
+            if values.dtype == object:
+                numeric = pd.to_numeric(values, errors="coerce")
+                if numeric.notna().sum() == values.notna().sum():
+                    values = numeric
+                else:
+                    values = values.astype(str).where(values.notna())
+            order = values.sort_values(ascending=ascending, kind="stable", na_position="last").index.values
+            self._orders[key] = cached = (self.rows, order)
+            while len(self._orders) > MAX_CACHED_QUERIES:
+                self._orders.pop(next(iter(self._orders)))
+        return cached[1]
+
+    def query(self, keyword="", sort_by=None, ascending=False, page=0, page_size=PAGE_SIZE):
+        """筛选、排序后取一页，返回 (该页数据, 匹配的总行数)
+
+        sort_by 为空时按到达顺序排序（ascending=False 为最新在前）。
+        """
+        if sort_by is None:
+            positions = np.arange(self.rows) if ascending else np.arange(self.rows - 1, -1, -1)
+        else:
+            positions = self._order(sort_by, ascending)
+        if keyword:
+            positions = positions[self._match(keyword)[positions]]
+        start = page * page_size
+        return self.take(positions[start:start + page_size]), len(positions)
+
+    def tail(self, since, limit=PAGE_SIZE):
+        """第 since 行之后新到的数据（最新在前，最多 limit 行）"""
+        return self.take(np.arange(self.rows - 1, max(since, self.rows - limit) - 1, -1))
@@ -1,4 +1,7 @@
 import streamlit as st
+from dataset_store import load_dataset
+from provinces import region_counts
+from live_feed import LiveTable
 
 def check_permissions():
     """检查用户权限，没有权限则阻止页面加载。"""
@@ -6,11 +9,74 @@ def check_permissions():
         st.error("请先登录")
         st.stop()  # 阻止继续加载
 
+def show_table(table, key):
+    """服务端筛选、排序、分页后只把当前页发送到浏览器。table 为 live_feed.LiveTable。"""
+    col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+    with col1:
+        keyword = st.text_input("筛选评论内容", key=f"{key}_keyword")
+    with col2:
+        sort_by = st.selectbox("排序", [None] + table.columns,
+                               format_func=lambda c: "到达顺序" if c is None else c, key=f"{key}_sort")
+    with col3:
+        ascending = st.checkbox("升序", key=f"{key}_ascending")
+    with col4:
+        page_size = st.selectbox("每页行数", [20, 50, 100, 200], index=1, key=f"{key}_page_size")
+
+    _, total = table.query(keyword, sort_by, ascending, page=0, page_size=0)
+    pages = max((total + page_size - 1) // page_size, 1)
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages  # 筛选后页数变少
+    page = st.number_input(f"页码（共 {pages} 页）", min_value=1, max_value=pages, step=1,
+                           key=f"{key}_page") if pages > 1 else 1
+    rows, total = table.query(keyword, sort_by, ascending, page=page - 1, page_size=page_size)
+    st.caption(f"共 {table.rows} 条，匹配 {total} 条")
+    st.dataframe(rows, use_container_width=True)
+
+def get_data_table():
+    """当前数据的分页视图（每份数据只建一次）"""
+    data = get_data()
+    key = (st.session_state.get('dataset_id'), id(st.session_state.get('data')), len(data))
+    cached = st.session_state.get('data_table')
+    if cached is None or cached[0] != key:
+        cached = (key, LiveTable(frame=data))
+        st.session_state.data_table = cached
+    return cached[1]
+
 def display_data():
-    """显示已上传的数据。"""
-    if 'data' in st.session_state:
-        data = st.session_state.data
+    """分页显示已上传的数据（不再把整份数据发送到浏览器）。"""
+    if st.session_state.get('data') is not None:
         st.write("### 数据实时展示：")
-        st.dataframe(data, use_container_width=True)
+        show_table(get_data_table(), key="data")
     else:
-        st.warning("请先上传文件")
\ No newline at end of file
+        st.warning("请先上传文件")
+
+@st.cache_resource(max_entries=8)
+def _load_dataset_columns(dataset_id, columns):
+    """按列内存映射读取数据集（进程内共享，调用方不要原地修改）"""
+    return load_dataset(dataset_id, list(columns) if columns else None)
+
+def get_data(columns=None):
+    """读取当前数据集的指定列。
+
+    已落盘的数据集在会话中只有标记（dataset_store.DatasetRef），按列读取、进程内共享，
+    只加载页面需要的列；未能落盘的数据退回会话中的 DataFrame。
+    """
+    data = st.session_state.get('data')
+    if data is None:
+        return None
+    dataset_id = st.session_state.get('dataset_id')
+    if dataset_id is None:
+        return data if columns is None else data[[c for c in columns if c in data.columns]]
+    return _load_dataset_columns(dataset_id, tuple(columns) if columns else None)
+
+def get_region_counts():
+    """当前数据各地区的条数（每份数据只统计一次，柱状图、饼图、地图共用）"""
+    data = get_data(['ip'])
+    if data is None or 'ip' not in data.columns:
+        return None
+    key = (st.session_state.get('dataset_id'), id(st.session_state.get('data')), len(data))
+    cached = st.session_state.get('region_counts')
+    if cached is None or cached[0] != key:
+        cached = (key, region_counts(data['ip']))
+        st.session_state.region_counts = cached
+    return cached[1]
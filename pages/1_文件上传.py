@@ -48,17 +48,63 @@ import streamlit as st
 import pandas as pd
 import datetime
 from mk import check_permissions
+from ingest import read_csv_chunked, MemoryBudgetExceeded, MEMORY_BUDGET_MB
+from dataset_store import save_dataset, list_datasets, dataset_ref, DatasetRef
+from provinces import normalize_regions
 
-def handle_file_upload(file):
+def handle_file_upload(file, chunked=True, memory_budget_mb=MEMORY_BUDGET_MB):
     """处理上传的文件并保存到 session_state """
     try:
-        data = pd.read_csv(file)
+        if chunked:
+            progress = st.progress(0.0, text="正在读取文件...")
+            data = read_csv_chunked(
+                file,
+                memory_budget_mb=memory_budget_mb,
+                on_progress=lambda fraction, rows: progress.progress(
+                    fraction, text=f"已读取 {rows} 行"),
+            )
+            progress.empty()
+        else:
+            data = pd.read_csv(file)
+            if 'ip' in data:
+                data['ip'] = normalize_regions(data['ip'])
         st.session_state.data = data
+        st.session_state.dataset_id = None
         return data
+    except MemoryBudgetExceeded as e:
+        st.error(f"文件过大：{e}，请调高内存预算或拆分文件后上传")
+        st.stop()
     except Exception as e:
         st.error(f"文件解析失败：{e}")
         st.stop()
 
+def persist_upload(data, file):
+    """把解析后的数据转存为列式数据集，之后可直接重新打开
+
+    保存成功后会话中只保留数据集标记，各页面按列读取；保存失败时数据仅留在当前会话中。
+    """
+    try:
+        dataset_id = save_dataset(data, file.name, file.size)
+        st.session_state.data = DatasetRef(dataset_id, len(data), data.columns)
+        st.session_state.dataset_id = dataset_id
+    except Exception as e:
+        st.warning(f"数据集保存失败，本次数据仅在当前会话中可用：{e}")
+
+def display_saved_datasets():
+    """列出已保存的数据集，可直接重新打开"""
+    datasets = list_datasets()
+    if not datasets:
+        st.info("暂无已保存的数据集")
+        return
+    st.dataframe(pd.DataFrame(datasets), use_container_width=True, hide_index=True)
+    options = {f"{d['id']} - {d['文件名']}（{d['上传时间']}）": d['id'] for d in datasets}
+    selected = st.selectbox("选择数据集", list(options))
+    if st.button("打开数据集"):
+        dataset_id = options[selected]
+        st.session_state.data = dataset_ref(dataset_id)
+        st.session_state.dataset_id = dataset_id
+        st.success(f"已打开数据集：{selected}")
+
 def display_upload_history():
     """显示文件上传历史"""
     if 'upload_history' in st.session_state:
@@ -82,21 +128,36 @@ def main():
 
     # 上传 CSV 文件
     uploaded_file = st.file_uploader("选择一个CSV文件(请确保存在review列和ip列)", type=["csv"])
+
+    # 读取方式配置
+    with st.expander("读取设置"):
+        chunked = st.checkbox("分块读取（只加载分析所需列，适合大文件）", value=True)
+        memory_budget_mb = st.number_input("内存预算（MB）", min_value=64,
+                                           value=MEMORY_BUDGET_MB, step=64,
+                                           disabled=not chunked)
     
     if uploaded_file is not None:
-        # 处理上传的文件
-        data = handle_file_upload(uploaded_file)
+        # 页面重跑时同一文件只解析、保存一次
+        if st.session_state.get('uploaded_file_id') != uploaded_file.file_id:
+            # 处理上传的文件
+            data = handle_file_upload(uploaded_file, chunked, memory_budget_mb)
+            persist_upload(data, uploaded_file)
+            st.session_state.uploaded_file_id = uploaded_file.file_id
+
+            # 保存文件信息到上传历史
+            file_info = {
+                "文件名": uploaded_file.name,
+                "上传时间": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
+            st.session_state.upload_history.insert(0, file_info)  # 插入到历史记录开头
         st.success("文件上传成功！")
-        
-        # 保存文件信息到上传历史
-        file_info = {
-            "文件名": uploaded_file.name,
-            "上传时间": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        st.session_state.upload_history.insert(0, file_info)  # 插入到历史记录开头
     else:
         st.info("请上传一个 CSV 文件进行查看。")
 
+    # 重新打开已保存的数据集
+    st.subheader("已保存的数据集")
+    display_saved_datasets()
+
     # 显示上传历史
     st.subheader("文件上传历史")
     display_upload_history()
@@ -1,11 +1,119 @@
 import streamlit as st
 import pandas as pd
-from mk import display_data,check_permissions
+from datetime import datetime
+from mk import display_data,check_permissions,get_data,show_table
+from crawl_jobs import list_jobs, rows_path
+from live_feed import LiveTable, JsonlTail, DirectoryWatch, WATCH_DIR, REFRESH_SECONDS
+from segment import tokenize_reviews, dataset_key
+from burst import get_detector, replay, load_stopwords
+
+SOURCES = {"live": "实时采集", "dataset": "当前数据集（按发布时间回放）"}
+VIEW_SOURCES = {"dataset": "当前数据集", "job": "采集任务", "watch": f"监听目录（{WATCH_DIR}/）"}
+
+def get_live_table(source_key):
+    """每个数据源一张增量表，保存在会话中，刷新时只读取新写入的数据"""
+    cached = st.session_state.get('live_table')
+    if cached is None or cached[0] != source_key:
+        kind, target = source_key
+        source = JsonlTail(rows_path(target)) if kind == "job" else DirectoryWatch(target)
+        cached = (source_key, LiveTable(source))
+        st.session_state.live_table = cached
+    return cached[1]
+
+def render_live(source_key):
+    """拉取新增数据并显示当前页，新到的数据单独列出"""
+    table = get_live_table(source_key)
+    before = table.rows
+    new_rows = table.poll()
+    st.caption(f"最近刷新 {datetime.now():%H:%M:%S}，本次新增 {new_rows} 条")
+    if new_rows and before:  # 首次加载的已有数据不算新到
+        with st.expander(f"🆕 新到的 {new_rows} 条", expanded=True):
+            st.dataframe(table.tail(before), use_container_width=True)
+    show_table(table, key="live")
+
+# 定时只重跑这一块，页面其余部分不刷新
+live_fragment = st.fragment(run_every=REFRESH_SECONDS)(render_live)
+
+def show_live_view():
+    """数据展示：当前数据集，或正在写入的采集任务 / 监听目录"""
+    source = st.radio("展示数据", list(VIEW_SOURCES), format_func=VIEW_SOURCES.get, horizontal=True)
+    if source == "dataset":
+        display_data()
+        return
+    if source == "job":
+        jobs = list_jobs()
+        if not jobs:
+            st.info("还没有采集任务")
+            return
+        job = st.selectbox("采集任务", jobs,
+                           format_func=lambda j: f"{j['keyword']}（{j['created']}，{j['status']}）")
+        source_key = ("job", job["id"])
+    else:
+        source_key = ("watch", WATCH_DIR)
+
+    st.write("### 数据实时展示：")
+    if st.toggle("自动刷新", value=True, help=f"每 {REFRESH_SECONDS} 秒拉取一次新增数据"):
+        live_fragment(source_key)
+    else:
+        render_live(source_key)
+
+# 回放结果按数据集缓存，同一份数据只回放一次
+@st.cache_resource(max_entries=4)
+def get_replay_detector(key, _tokens, _published):
+    return replay(_tokens, _published, exclude=load_stopwords())
+
+def format_window(detector):
+    minutes = detector.bucket_seconds * detector.window_buckets // 60
+    if minutes >= 1440:
+        return f"{minutes // 1440} 天"
+    if minutes >= 60:
+        return f"{minutes // 60} 小时"
+    return f"{minutes} 分钟"
+
+def show_bursts():
+    """热词与突发词：实时采集的数据流，或当前数据集按发布时间回放"""
+    st.write("### 热词与突发词")
+    source = st.radio("数据来源", list(SOURCES), format_func=SOURCES.get, horizontal=True)
+    if source == "live":
+        detector = get_detector()
+        if detector.posts == 0:
+            st.info("暂无实时数据，在“爬虫”页面启动采集任务后，新采集的微博会计入这里")
+            return
+        st.button("刷新")
+    else:
+        data = get_data(['review', '发布时间'])
+        if data is None or 'review' not in data or '发布时间' not in data:
+            st.info("当前数据集缺少 review 或 发布时间 列")
+            return
+        reviews = data['review'].dropna()
+        published = data['发布时间'].loc[reviews.index]
+        with st.spinner("正在回放数据..."):
+            key = (dataset_key(reviews), dataset_key(published.astype(str)))
+            detector = get_replay_detector(key, tokenize_reviews(reviews), published)
+        if detector is None:
+            st.info("发布时间无法解析，无法回放")
+            return
+
+    st.caption(f"累计 {detector.posts} 条，滑动窗口（{format_window(detector)}）内 {detector.window_posts} 条")
+    if detector.warming_up:
+        st.warning("基线仍在积累中，突发词仅供参考")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("**窗口热词**")
+        st.dataframe(detector.hot_terms()[["词", "窗口次数"]], use_container_width=True, hide_index=True)
+    with col2:
+        st.write("**突发词**（窗口次数明显高于历史基线）")
+        bursts = detector.bursts()
+        if bursts.empty:
+            st.info("当前没有突发词")
+        else:
+            st.dataframe(bursts, use_container_width=True, hide_index=True)
 
 def main():
     """主页面逻辑。"""
     check_permissions()  # 调用权限验证函数
-    display_data()       # 调用数据展示函数
+    show_live_view()     # 数据展示（当前数据集或实时数据源）
+    show_bursts()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
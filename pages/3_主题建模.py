@@ -1,43 +1,71 @@
 import streamlit as st
 import streamlit_echarts as st_echarts
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.decomposition import LatentDirichletAllocation
-from sklearn.cluster import KMeans
-from sklearn.manifold import TSNE
-import jieba
 import pandas as pd
-from mk import check_permissions
+from mk import check_permissions, get_data
+from segment import tokenize_reviews, dataset_key
+from features import FeatureStore
+from topic_models import fit_or_update, adopt_model
+from autotune import METRICS, sweep
+from topic_inference import TopicAssignments
+from embedding import SAMPLE_PER_CLUSTER, embed_clusters, scatter_option
 
-def do_data():
-    jieba.load_userdict("custom_dict.txt") 
+@st.cache_data
+def load_stopwords(path="stopwords.txt"):
+    """加载中文停用词"""
+    with open(path, "r", encoding="utf-8") as f:
+        return set(line.strip() for line in f.readlines())
 
-    data = st.session_state.data
-    # 加载中文停用词 
-    with open("stopwords.txt",  "r", encoding="utf-8") as f:
-        stopwords = [line.strip() for line in f.readlines()] 
-    data['processed'] = data['review'].fillna('').apply(
-        lambda x: " ".join([word for word in jieba.cut(x) if word not in stopwords and len(word) > 1])
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_processed(dataset, _reviews):
+    """每个数据集只做一次停用词过滤（复用共享分词结果）"""
+    stopwords = load_stopwords()
+    tokens = tokenize_reviews(_reviews)
+    return tokens.map(
+        lambda words: " ".join([word for word in words if word not in stopwords and len(word) > 1])
     )
-    return data
 
-def vectorize_text(data, max_df=0.95, min_df=2):
-    """特征向量化"""
-    vectorizer = TfidfVectorizer(max_df=max_df, min_df=min_df)
-    X = vectorizer.fit_transform(data['processed'])
-    return X.astype(np.float32), vectorizer.get_feature_names_out()
+def do_data():
+    """返回本页的数据表和数据集标识（按评论内容计算，重跑页面时不再重新过滤）
+
+    本页要追加 processed、主题 等列，不能修改 get_data 返回的共享数据，
+    因此在会话中单独保存一份浅拷贝（只有新增的列占用会话内存）。
+    """
+    key = (st.session_state.get('dataset_id'), id(st.session_state.data))
+    cached = st.session_state.get('topic_data')
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2]
+    data = get_data(['review', '发布时间', 'ip']).copy(deep=False)
+    dataset = dataset_key(data['review'])
+    data['processed'] = get_processed(dataset, data['review'])
+    st.session_state.topic_data = (key, data, dataset)
+    return data, dataset
 
-def train_lda(X, num_topics):
-    """训练 LDA 模型"""
-    lda = LatentDirichletAllocation(n_components=num_topics, random_state=42)
-    lda.fit(X)
-    return lda
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_feature_store(dataset, _processed):
+    """每个数据集只统计一次词频，各种参数下的特征矩阵都由它派生"""
+    return FeatureStore(_processed)
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_topic_model(dataset, method, n_components, max_df, min_df, _store):
+    """按数据集和参数缓存模型及特征矩阵，调整可视化选项时不再重新训练
+
+    模型同时持久化在 models/ 下，数据增长时增量更新（见 topic_models.fit_or_update）。
+    """
+    topic_model = fit_or_update(_store, method, n_components, max_df, min_df)
+    if topic_model.status == "trained":
+        X = _store.tfidf(max_df, min_df)[0]
+    else:
+        X = topic_model.transform(_store)
+    return topic_model, X
 
-def train_kmeans(X, num_clusters):
-    """训练 KMeans 模型"""
-    kmeans = KMeans(n_clusters=num_clusters, random_state=42)
-    cluster_labels = kmeans.fit_predict(X)
-    return kmeans, cluster_labels
+MAX_COMPONENTS = 20
+
+STATUS_MESSAGES = {
+    "trained": "已训练新模型",
+    "updated": "已用新增数据增量更新模型",
+    "cached": "已复用保存的模型",
+}
 
 def generate_lda_visualization(lda, features, num_topics):
     """生成 LDA 主题可视化图表"""
@@ -73,7 +101,13 @@ def generate_lda_visualization(lda, features, num_topics):
     
     return topic_options
 
-def generate_kmeans_visualization(kmeans, features, cluster_labels, X, use_tsne, num_clusters):
+@st.cache_data(max_entries=4, show_spinner=False)
+def get_cluster_embedding(dataset, model_key, cap, _X, _labels):
+    """缓存抽样后的二维嵌入，只调整其他选项时不重新计算 t-SNE"""
+    return embed_clusters(_X, _labels, cap)
+
+def generate_kmeans_visualization(kmeans, features, cluster_labels, X, use_tsne, num_clusters,
+                                  dataset=None, model_key=None, sample_cap=SAMPLE_PER_CLUSTER):
     """生成 KMeans 聚类可视化图表"""
     cluster_keywords = []
     for idx in range(num_clusters):
@@ -84,27 +118,115 @@ def generate_kmeans_visualization(kmeans, features, cluster_labels, X, use_tsne,
     
     tsne_option = None
     if use_tsne and X.shape[0] > 10:
-        tsne = TSNE(n_components=2, random_state=42)
-        embeddings = tsne.fit_transform(X.toarray())
-        scatter_data = []
-        for i in range(len(embeddings)):
-            scatter_data.append({
-                "value": [float(embeddings[i, 0]), float(embeddings[i, 1])],
-                "itemStyle": {"color": f"hsl({(cluster_labels[i] * 360) // num_clusters}, 60%, 60%)"}
-            })
-        tsne_option = {
-            "title": {"text": "t-SNE 聚类分布图"},
-            "xAxis": {"type": "value"},
-            "yAxis": {"type": "value"},
-            "series": [{
-                "type": "scatter",
-                "data": scatter_data,
-                "itemStyle": {"opacity": 0.6},
-                "symbolSize": 10
-            }]
-        }
+        embedding = get_cluster_embedding(dataset, model_key, sample_cap, X, cluster_labels)
+        if embedding is not None:
+            rows, coords = embedding
+            title = "t-SNE 聚类分布图"
+            if len(rows) < X.shape[0]:
+                title += f"（按聚类抽样 {len(rows)} / {X.shape[0]} 篇）"
+            tsne_option = scatter_option(coords, cluster_labels[rows], num_clusters, title)
     return cluster_keywords, tsne_option
 
+def generate_autotune_chart(table, method, best):
+    """自动选择的得分曲线（LDA 同时显示困惑度）"""
+    metric, label = METRICS[method]
+    candidates = [int(n) for n in table["n_components"]]
+    series = [{
+        "name": label,
+        "type": "line",
+        "data": [round(float(v), 4) for v in table[metric]],
+        "markPoint": {"data": [{"coord": [str(best), round(float(table.loc[table["n_components"] == best, metric].iloc[0]), 4)],
+                                "value": best}]},
+    }]
+    y_axis = [{"type": "value", "name": label, "scale": True}]
+    if "perplexity" in table:
+        series.append({
+            "name": "困惑度",
+            "type": "line",
+            "yAxisIndex": 1,
+            "lineStyle": {"type": "dashed"},
+            "data": [round(float(v), 2) for v in table["perplexity"]],
+        })
+        y_axis.append({"type": "value", "name": "困惑度", "scale": True})
+    return {
+        "title": {"text": "候选数量得分"},
+        "tooltip": {"trigger": "axis"},
+        "legend": {"top": 30},
+        "grid": {"top": 80},
+        "xAxis": {"type": "category", "name": "数量", "data": [str(n) for n in candidates]},
+        "yAxis": y_axis,
+        "series": series,
+    }
+
+def run_autotune(store, dataset, method_key, max_df, min_df, candidates):
+    """并行训练各候选并保存最优模型，下次重跑时把数量滑块设为最优值"""
+    X, _, _ = store.tfidf(max_df, min_df)
+    counts = store.count_view(max_df, min_df)[0] if method_key == "lda" else None
+    table, best, model = sweep(method_key, X, counts, candidates)
+    adopt_model(store, method_key, best, max_df, min_df, model)
+    get_topic_model.clear()
+    get_topic_assignments.clear()
+    get_cluster_embedding.clear()
+    st.session_state.autotune_result = {
+        "dataset": dataset, "method": method_key, "params": (max_df, min_df),
+        "table": table, "best": best,
+    }
+    st.session_state.autotune_pick = (method_key, best)
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_topic_assignments(dataset, model_key, _lda, _X, _published, _regions):
+    """缓存文档主题归属和按日期、地区的预汇总表"""
+    return TopicAssignments(_lda, _X, _published, _regions)
+
+def generate_topic_trend(by_day, topics):
+    """各主题每日文档数趋势图"""
+    return {
+        "title": {"text": "主题热度趋势"},
+        "tooltip": {"trigger": "axis"},
+        "legend": {"top": 30},
+        "grid": {"top": 80},
+        "xAxis": {"type": "category", "data": [day.strftime("%Y-%m-%d") for day in by_day.index]},
+        "yAxis": {"type": "value", "name": "文档数"},
+        "dataZoom": [{"type": "slider"}],
+        "series": [
+            {"name": f"主题 {topic + 1}", "type": "line", "data": by_day[topic].tolist()}
+            for topic in topics
+        ],
+    }
+
+def generate_topic_regions(by_region, topics, top_n=15):
+    """文档数最多的地区中各主题的分布（堆叠条形图）"""
+    table = by_region.loc[by_region.sum(axis=1).nlargest(top_n).index[::-1]]
+    return {
+        "title": {"text": f"主题地区分布（前 {top_n} 个地区）"},
+        "tooltip": {"trigger": "axis", "axisPointer": {"type": "shadow"}},
+        "legend": {"top": 30},
+        "grid": {"top": 80, "containLabel": True},
+        "xAxis": {"type": "value"},
+        "yAxis": {"type": "category", "data": table.index.tolist()},
+        "series": [
+            {"name": f"主题 {topic + 1}", "type": "bar", "stack": "total", "data": table[topic].tolist()}
+            for topic in topics
+        ],
+    }
+
+def show_topic_assignments(assignments):
+    """文档主题归属、主题趋势和地区分布"""
+    sizes = assignments.topic_sizes()
+    st.write("### 文档主题归属")
+    st.caption("，".join(f"主题 {topic + 1}：{size} 篇" for topic, size in enumerate(sizes)))
+    topics = st.multiselect("选择主题", list(range(assignments.num_topics)),
+                            default=list(range(assignments.num_topics)),
+                            format_func=lambda topic: f"主题 {topic + 1}")
+    if not topics:
+        return
+    if assignments.by_day is not None and len(assignments.by_day):
+        st_echarts.st_echarts(options=generate_topic_trend(assignments.by_day, topics),
+                              height="420px", key="topic_trend")
+    if assignments.by_region is not None and len(assignments.by_region):
+        st_echarts.st_echarts(options=generate_topic_regions(assignments.by_region, topics),
+                              height="520px", key="topic_regions")
+
 def main():
     check_permissions()
     
@@ -112,33 +234,67 @@ def main():
     if 'data' not in st.session_state:
         st.session_state.data = None
     
-    if 'data' in st.session_state:
-        data = st.session_state.data
+    if st.session_state.get('data') is not None:
         st.write("### 主题建模分析系统")
         
         # 数据预处理
-        data = do_data()
+        data, dataset = do_data()
         
         # 方法选择
         method = st.radio("选择分析方法", ["LDA主题模型", "KMeans聚类分析"])
         
+        # 自动选择的结果需在数量滑块创建之前写入
+        st.session_state.setdefault("num_topics", 5)
+        st.session_state.setdefault("num_clusters", 5)
+        pick = st.session_state.pop("autotune_pick", None)
+        if pick is not None:
+            st.session_state["num_topics" if pick[0] == "lda" else "num_clusters"] = pick[1]
+        
         # 高级参数配置
         with st.expander("高级参数配置"):
             max_df = st.slider("最大文档频率", 0.7, 1.0, 0.95)
             min_df = st.slider("最小文档频率", 1, 10, 2)
             use_tsne = st.checkbox("启用t-SNE降维可视化(仅k-means时可选)")
+            sample_cap = st.slider("t-SNE 每个聚类最多显示的文档数", 100, 5000, SAMPLE_PER_CLUSTER, 100,
+                                   help="先按聚类分层抽样再降维，数据量大时也能快速出图")
             
             if method == "LDA主题模型":
-                num_topics = st.slider("主题数量", 2, 10, 5)
+                num_topics = st.slider("主题数量", 2, MAX_COMPONENTS, key="num_topics")
             else:
-                num_clusters = st.slider("聚类数量", 2, 10, 5)
+                num_clusters = st.slider("聚类数量", 2, MAX_COMPONENTS, key="num_clusters")
+        
+        method_key = "lda" if method == "LDA主题模型" else "kmeans"
+        n_components = num_topics if method == "LDA主题模型" else num_clusters
+        store = get_feature_store(dataset, data['processed'])
+        
+        with st.expander("自动选择主题数 / 聚类数"):
+            low, high = st.slider("候选数量范围", 2, MAX_COMPONENTS, (2, 10))
+            st.caption("LDA 按 UMass 一致性选择（同时显示困惑度），KMeans 按抽样轮廓系数选择；各候选在多进程中并行训练")
+            if st.button("开始自动选择"):
+                with st.spinner(f'正在训练 {high - low + 1} 个候选模型...'):
+                    run_autotune(store, dataset, method_key, max_df, min_df, range(low, high + 1))
+                st.rerun()
+            result = st.session_state.get("autotune_result")
+            if (result and result["dataset"] == dataset and result["method"] == method_key
+                    and result["params"] == (max_df, min_df)):
+                st.success(f"最优数量：{result['best']}")
+                st_echarts.st_echarts(options=generate_autotune_chart(result["table"], method_key, result["best"]),
+                                      height="360px", key="autotune_chart")
+        if st.button("重新训练模型", help="忽略已保存的模型，用当前全部数据重新训练（词表随之更新）"):
+            get_topic_model.clear()
+            get_topic_assignments.clear()
+            get_cluster_embedding.clear()
+            with st.spinner('重新训练中...'):
+                fit_or_update(store, method_key, n_components, max_df, min_df, refit=True)
         
-        # 特征向量化
-        X, features = vectorize_text(data, max_df, min_df)
+        with st.spinner('主题建模中...' if method == "LDA主题模型" else '聚类分析中...'):
+            topic_model, X = get_topic_model(dataset, method_key, n_components, max_df, min_df, store)
+        features = topic_model.features
+        st.caption(STATUS_MESSAGES[topic_model.status])
         
         if method == "LDA主题模型":
             with st.spinner('主题建模中...'):
-                lda = train_lda(X, num_topics)
+                lda = topic_model.model
                 topic_options = generate_lda_visualization(lda, features, num_topics)
                 
                 st.write("### 主题关键词分布")
@@ -151,12 +307,25 @@ def main():
                             height=f"{len(option['yAxis']['data'])*30 + 100}px",
                             key=f"topic{idx}"
                         )
+            
+            with st.spinner('推断文档主题...'):
+                assignments = get_topic_assignments(
+                    dataset, topic_model.key, lda, X,
+                    data['发布时间'] if '发布时间' in data else None,
+                    data['ip'] if 'ip' in data else None
+                )
+            # 主导主题（从 1 开始编号，与图表一致）和概率作为数据列保存
+            data['主题'] = assignments.frame['主题'].values + 1
+            data['主题概率'] = assignments.frame['主题概率'].values
+            show_topic_assignments(assignments)
         
         elif method == "KMeans聚类分析":
             with st.spinner('聚类分析中...'):
-                kmeans, cluster_labels = train_kmeans(X, num_clusters)
+                kmeans = topic_model.model
+                cluster_labels = kmeans.predict(X)
                 cluster_keywords, tsne_option = generate_kmeans_visualization(
-                    kmeans, features, cluster_labels, X, use_tsne, num_clusters
+                    kmeans, features, cluster_labels, X, use_tsne, num_clusters,
+                    dataset=dataset, model_key=topic_model.key, sample_cap=sample_cap
                 )
                 
                 # 显示聚类关键词
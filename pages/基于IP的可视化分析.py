@@ -3,7 +3,8 @@ from pyecharts import options as opts
 from pyecharts.charts  import Map,Bar, Pie
 import pandas as pd 
 from streamlit_echarts import st_pyecharts 
-from mk import check_permissions  
+from mk import check_permissions, get_region_counts
+from provinces import map_data
 
 # 配置中文环境 
 def set_chinese(): 
@@ -54,55 +55,11 @@ def create_pie(data) -> Pie:
     ) 
     return pie 
 
-@st.cache_data 
-def count_provinces(df):
-    province_map = {
-        "江苏": "江苏省",
-        "浙江": "浙江省",
-        "安徽": "安徽省",
-        "福建": "福建省",
-        "江西": "江西省",
-        "山东": "山东省",
-        "河南": "河南省",
-        "湖北": "湖北省",
-        "湖南": "湖南省",
-        "广东": "广东省",
-        "广西": "广西壮族自治区",
-        "海南": "海南省",
-        "四川": "四川省",
-        "贵州": "贵州省",
-        "云南": "云南省",
-        "西藏": "西藏自治区",
-        "陕西": "陕西省",
-        "甘肃": "甘肃省",
-        "青海": "青海省",
-        "宁夏": "宁夏回族自治区",
-        "新疆": "新疆维吾尔自治区",
-        "北京": "北京市",
-        "天津": "天津市",
-        "上海": "上海市",
-        "重庆": "重庆市",
-        "香港": "香港特别行政区",
-        "澳门": "澳门特别行政区",
-        "台湾": "台湾省"
-    }
-
-    if 'ip' not in df.columns: 
-        st.error("CSV  文件中没有名为 'ip' 的列。")
-        return []
-    
-    # 使用.loc 确保操作在原始数据框上进行
-    df.loc[df['ip'].notna(),  'ip'] = df.loc[df['ip'].notna(),  'ip'].map(province_map)
-    
-    # 统计省份 IP 出现次数
-    province_counts = df['ip'].value_counts().reset_index()
-    province_counts.columns  = ['省份', '次数']
-    
-    data = list(zip(province_counts['省份'], province_counts['次数']))
-    
+def province_map_data(counts):
+    """地图数据：省级行政区的条数（地区已在读入时规范化，这里只换成地图名称）"""
+    data = map_data(counts)
     if not data:
         data = [["未记录", 0]]
-    
     return data
 
 # 创建地图
@@ -127,11 +84,11 @@ def create_china_map(data):
 def main():
     check_permissions()
     if 'data' in st.session_state:   
-        data1 = st.session_state.data 
-        data2 = st.session_state.data   
+        province_counts = get_region_counts()
+        if province_counts is None:
+            st.error("CSV  文件中没有名为 'ip' 的列。")
+            st.stop()
         st.title("   舆情地域分布") 
-        data1['ip'] = data1['ip'].fillna('未知') 
-        province_counts = data1['ip'].value_counts() 
 
         # 移除双列布局 
         st.markdown("###    舆情地区分布柱状图") 
@@ -141,7 +98,7 @@ def main():
         st_pyecharts(create_pie(province_counts), height=500)
 
         # 统计省份 IP 数据
-        province_data = count_provinces(data2)
+        province_data = province_map_data(province_counts)
         
         # 创建地图
         map_chart = create_china_map(province_data)
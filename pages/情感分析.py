@@ -1,12 +1,15 @@
 import streamlit as st
 import pandas as pd
 import streamlit_echarts as ste
-from snownlp import SnowNLP
 import matplotlib.pyplot as plt
 from wordcloud import WordCloud
 import numpy as np
 import io
-
+from segment import tokenize_reviews, dataset_key
+from sentiment_scorer import BatchSentimentScorer
+from score_cache import ScoreCache
+from mk import get_data
+from sentiment_cube import SentimentCube, ALL_REGIONS, GRAIN_NAMES, auto_grain
 
 
 # 数据处理函数
@@ -24,10 +27,34 @@ def process_data(data):
     
     return data
 
+# 情感模型只加载一次
+@st.cache_resource
+def get_sentiment_scorer():
+    return BatchSentimentScorer()
+
+# 情感得分持久化缓存（按模型版本区分）
+@st.cache_resource
+def get_score_cache():
+    return ScoreCache(model_version=get_sentiment_scorer().model_version)
+
+# 每份数据的情感得分只计算一次：首次计算时查询得分缓存，只对未命中的评论分词并打分
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_sentiment_scores(dataset, _reviews):
+    cache = get_score_cache()
+    scores = pd.Series(cache.get_many(_reviews), index=_reviews.index, dtype="float64")
+    missing = scores.isna()
+    if missing.any():
+        reviews = _reviews[missing]
+        tokens = tokenize_reviews(reviews, engine="snownlp")
+        new_scores = get_sentiment_scorer().score(tokens)
+        scores[missing] = new_scores
+        cache.put_many(reviews, new_scores)
+    return scores
+
 # 情感分析函数
 def calculate_sentiment(df):
-    # 计算情感得分
-    df["sentiment"] = df["review"].apply(handle_sentiment)
+    scores = get_sentiment_scores(dataset_key(df["review"]), df["review"])
+    df["sentiment"] = scores.values
     
     # 修饰情感分数
     bins = [0, 0.4, 0.6, 1]
@@ -37,12 +64,6 @@ def calculate_sentiment(df):
     )
     return df
 
-def handle_sentiment(x):
-    try:
-        return SnowNLP(x).sentiments
-    except:
-        return 0.5  # 自定义默认值
-
 # 生成情感饼图
 def build_pie_chart(df):
     sentiment_counts = (
@@ -96,76 +117,79 @@ def build_pie_chart(df):
     }
     return option
 
+# 情感趋势聚合表（每个会话一份，新数据到达时增量累加）
+def get_sentiment_cube(df):
+    cube = st.session_state.get("sentiment_cube")
+    if cube is None:
+        cube = SentimentCube()
+        st.session_state.sentiment_cube = cube
+    cube.update(df)
+    return cube
+
 # 生成情感趋势分析图
-def build_line_chart(df):
-    # 确保 "发布时间" 列存在
-    if "发布时间" not in df.columns:
-        st.warning("数据中没有发布时间列，无法生成情感趋势图。")
+def build_line_chart(cube, grain=None, region=ALL_REGIONS):
+    span = cube.span()
+    if span is None:
+        st.warning("发布时间无法解析，无法生成情感趋势图。")
         return {}
     
-    # 转换时间为日期格式
-    df["发布时间"] = pd.to_datetime(df["发布时间"]).dt.date  # Ensure date type
-    
-    # 按天分组获取情感得分均值并填充缺失值
-    grouped = df.groupby("发布时间")
-    sentiment_trend = grouped["sentiment"].mean().reset_index()
-    
-    # 创建完整的日期范围
-    start_date = df["发布时间"].min()
-    end_date = df["发布时间"].max()
-    date_range = pd.date_range(start=start_date, end=end_date)
-    
-    # 创建新的 DataFrame 用于合并
-    sentiment_trend_display = pd.DataFrame({"时间": date_range.date})
-    
-    # 合并并填充缺失值
-    sentiment_trend_display = pd.merge(
-        sentiment_trend_display, 
-        sentiment_trend.rename(columns={"发布时间": "时间"}),
-        on="时间",
-        how="left"
-    ).fillna(0)  # 填充空缺值
-    
-    # 调整图表展示的时间间隔
-    delta = (end_date - start_date).days
-    if delta > 365:
-        freq = "M"  # 每月
-    elif delta > 30:
-        freq = "W"  # 每周
-    else:
-        freq = "D"  # 每天
+    # 未指定粒度时按时间跨度自动选择（按天 / 按周 / 按月）
+    grain = grain or auto_grain(*span)
+    sentiment_trend_display = cube.trend(grain, region)
+    if sentiment_trend_display.empty:
+        st.warning("所选地区没有可用的数据。")
+        return {}
     
-    # 动态调整 x 轴标签间隔
-    interval = get_dynamic_interval(delta)
+    # 动态调整 x 轴标签间隔（按天时沿用按跨度的间隔，其余粒度点数较少，自动间隔）
+    interval = get_dynamic_interval((span[1] - span[0]).days) if grain == "D" else "auto"
+    date_format = "%Y-%m" if grain == "M" else "%Y-%m-%d"
     
     option = {
         "title": {
-            "text": "舆情情感趋势",
+            "text": f"舆情情感趋势（{GRAIN_NAMES[grain]}）",
             "left": "center",
             "textStyle": {"fontSize": 18},
         },
         "tooltip": {"trigger": "axis"},
+        "legend": {"top": 30},
+        "grid": {"top": 80},
         "xAxis": {
             "type": "category",
-            "data": sentiment_trend_display["时间"].astype(str).tolist(),
+            "data": sentiment_trend_display.index.strftime(date_format).tolist(),
             "axisLabel": {
                 "rotate": 45,
                 "interval": interval,  # 动态间隔
                 "formatter": "{value}",
             },
-            "boundaryGap": False,
-        },
-        "yAxis": {
-            "type": "value",
-            "name": "情感得分",
-            "min": 0,
-            "max": 1,
         },
+        "yAxis": [
+            {
+                "type": "value",
+                "name": "情感得分",
+                "min": 0,
+                "max": 1,
+            },
+            {
+                "type": "value",
+                "name": "评论数",
+                "splitLine": {"show": False},
+            },
+        ],
         "series": [
+            {
+                "name": label,
+                "type": "bar",
+                "stack": "labels",
+                "yAxisIndex": 1,
+                "data": sentiment_trend_display[label].tolist(),
+                "itemStyle": {"color": color, "opacity": 0.35},
+            }
+            for label, color in (("消极", "#0000ff"), ("中性", "#9E9E9E"), ("积极", "#ff0000"))
+        ] + [
             {
                 "name": "情感得分",
                 "type": "line",
-                "data": sentiment_trend_display["sentiment"].tolist(),
+                "data": sentiment_trend_display["sentiment"].round(4).tolist(),
                 "symbolSize": 8,
                 "smooth": True,
                 "itemStyle": {"color": "#4CAF50"},
@@ -192,15 +216,18 @@ def main():
         st.stop()
 
     # 数据上传与初始化
-    if "data" not in st.session_state:
+    if st.session_state.get("data") is None:
         st.warning("请先上传文件")
         st.stop()
     else:
-        data = st.session_state.data.copy()
+        data = get_data(["review", "发布时间", "ip"]).copy()
 
     # 数据处理管道
     data = process_data(data)
     df = calculate_sentiment(data)
+    cache_stats = get_score_cache().stats()
+    st.caption(f"情感得分缓存：命中 {cache_stats['hits']} 次，未命中 {cache_stats['misses']} 次，"
+               f"缓存条目 {cache_stats['entries']} 条")
 
     # 渲染图表
     st.write("### 舆情情感分布可视化")
@@ -208,8 +235,18 @@ def main():
     ste.st_echarts(options=pie_chart_options, height="500px")
 
     st.write("### 舆情情感趋势分析")
-    line_chart_options = build_line_chart(df)
-    ste.st_echarts(options=line_chart_options, height="500px")
+    if "发布时间" not in df.columns:
+        st.warning("数据中没有发布时间列，无法生成情感趋势图。")
+        return
+    cube = get_sentiment_cube(df)
+    col1, col2 = st.columns(2)
+    grain = col1.selectbox("时间粒度", [None] + list(GRAIN_NAMES),
+                           format_func=lambda g: "自动" if g is None else GRAIN_NAMES[g])
+    region = col2.selectbox("IP属地", [ALL_REGIONS] + cube.regions,
+                            format_func=lambda r: "全部" if r is ALL_REGIONS else r)
+    line_chart_options = build_line_chart(cube, grain, region)
+    if line_chart_options:
+        ste.st_echarts(options=line_chart_options, height="500px")
 
 if __name__ == "__main__":
     main()       
@@ -1,286 +1,118 @@
-import time
-import random
+import numpy as np
 import pandas as pd
-import requests
 import streamlit as st
 from datetime import datetime, timedelta
+from crawl_jobs import submit_job, list_jobs, load_job, rows_path, cancel_job, resume_job, resume_jobs, ACTIVE_STATUSES
+from live_feed import JsonlTail, LiveTable
+from mk import show_table
+from driver_pool import POOL_SIZE, get_pool
+from crawler import ENGINES, SEARCH_URL
 from urllib.parse import quote
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException, InvalidCookieDomainException, WebDriverException
 
-# IP获取相关配置
-API_RETRY = 3
-IP_API_DELAY = (1, 3)
-IP_API_TIMEOUT = 10
+STATUS_LABELS = {
+    "queued": "排队中",
+    "running": "采集中",
+    "done": "已完成",
+    "failed": "失败",
+    "cancelled": "已停止",
+}
+PREVIEW_ROWS = 200  # 任务进行中预览的最新数据条数
 
-def configure_chrome_options():
-    """配置Chrome浏览器选项"""
-    options = Options()
-    
-    # 基础配置
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-infobars")
-    options.add_argument("--disable-extensions")
-    
-    # 反爬虫规避设置
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
-    options.add_experimental_option("useAutomationExtension", False)
-    
-    # 用户代理池
-    user_agents = [
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36"
-    ]
-    options.add_argument(f"user-agent={random.choice(user_agents)}")
-    
-    # 性能优化
-    options.add_argument("--disable-images")
-    options.add_argument("--blink-settings=imagesEnabled=false")
-    options.add_experimental_option("prefs", {
-        "profile.managed_default_content_settings.images": 2,
-        "profile.default_content_setting_values.notifications": 2,
-        "credentials_enable_service": False,
-        "profile.password_manager_enabled": False
-    })
-    
-    # 语言设置
-    options.add_argument("--lang=zh-CN")
-    options.add_argument("--accept-language=zh-CN,zh;q=0.9")
-    
-    return options
+def render_progress(job):
+    """展示采集进度与吞吐量"""
+    cols = st.columns(5)
+    cols[0].metric("状态", STATUS_LABELS.get(job["status"], job["status"]))
+    cols[1].metric("已抓取页数", job["pages"])
+    cols[2].metric("已采集微博", f"{job['collected']} / {job['max_posts']}")
+    cols[3].metric("跳过重复", job["skipped"])
+    cols[4].metric("采集速度（条/分钟）", f"{job['posts_per_minute']:.1f}")
+    parse_ms = job.get("parse_ms")
+    if parse_ms:
+        st.caption("平均每页解析耗时：" + "，".join(
+            f"{ENGINES.get(engine, engine)} {ms:.1f} ms" for engine, ms in parse_ms.items()))
 
-def init_webdriver():
-    """初始化浏览器实例"""
-    try:
-        from webdriver_manager.chrome import ChromeDriverManager
-        service = Service(executable_path=ChromeDriverManager().install())
-        options = configure_chrome_options()
-        driver = webdriver.Chrome(service=service, options=options)
-        return driver
-    except Exception as e:
-        st.error(f"浏览器初始化失败: {str(e)}")
-        raise RuntimeError("无法启动浏览器，请检查ChromeDriver配置")
+def show_engine_benchmark(keyword):
+    """用同一搜索页比较几种解析方式的耗时和字段一致性"""
+    from html_engine import compare_engines
+    with st.expander("⏱ 解析引擎对比"):
+        st.caption("借用一个浏览器会话打开搜索结果第 1 页，分别用两种方式解析")
+        if not st.button("运行对比"):
+            return
+        with st.spinner("正在加载搜索页..."):
+            with get_pool().session() as driver:
+                result = compare_engines(driver, SEARCH_URL.format(quote(keyword)))
+        labels = {"elements": "浏览器逐元素读取", "selenium": "浏览器整页脚本读取", "html": "HTML 直接解析"}
+        cols = st.columns(len(labels))
+        for col, (engine, label) in zip(cols, labels.items()):
+            col.metric(label, f"{result[engine]['parse_ms']:.1f} ms",
+                       f"{result[engine]['cards']} 条微博", delta_color="off")
+        if result["mismatches"]:
+            st.warning(f"{len(result['mismatches'])} 条微博字段不一致")
+            st.dataframe(pd.DataFrame(result["mismatches"]), use_container_width=True)
+        else:
+            st.success("两种方式解析出的字段完全一致")
 
-def load_cookies(driver):
-    """加载微博Cookie"""
-    cookies = [
-        {
-            "name": "SUB",
-            "value": "_2A25Kvql6DeRhGeFM7lQQ-SzEzz-IHXVptaSyrDV8PUNbmtAYLVaskW9NQN2BkAvhupcrROysKhyF-f1eCou5SZ7u",
-            "domain": ".weibo.com",
-            "path": "/",
-            "expires": datetime.now().timestamp() + 86400,
-            "httpOnly": True,
-            "secure": True
-        },
-        {
-            "name": "SUBP",
-            "value": "0033WrSXqPxfM725Ws9jqgMF55529P9D9WFEJijQVlllSysUmdzKHGR65JpX5KzhUgL.FoMESKqp1KzRShe2dJLoIp7LxKML1KBLBKnLxKqL1hnLBoMNeo-ceK.E1hB0",
-            "domain": ".weibo.com",
-            "path": "/",
-            "expires": datetime.now().timestamp() + 86400,
-            "httpOnly": True,
-            "secure": True
-        }
-    ]
-    
-    driver.get("https://weibo.com")
-    time.sleep(2)
-    
-    for cookie in cookies:
-        try:
-            formatted_cookie = {
-                'name': cookie['name'],
-                'value': cookie['value'],
-                'domain': ".weibo.com",
-                'path': '/',
-                'httpOnly': True,
-                'secure': True
-            }
-            driver.add_cookie(formatted_cookie)
-        except Exception as e:
-            print(f"添加Cookie失败: {cookie['name']} - {str(e)}")
-    
-    driver.refresh()
-    time.sleep(3)
-    return driver
+def get_job_table(job_id):
+    """任务数据的增量视图：每次刷新只读取 rows.jsonl 中新写入的行"""
+    cached = st.session_state.get("job_table")
+    if cached is None or cached[0] != job_id:
+        cached = (job_id, LiveTable(JsonlTail(rows_path(job_id))))
+        st.session_state.job_table = cached
+    table = cached[1]
+    table.poll()
+    return table
 
-def get_ip_location(bid, driver):
-    """通过微博API获取IP属地"""
-    api_url = f"https://weibo.com/ajax/statuses/show?id={bid}"
-    
-    try:
-        cookies = {c['name']: c['value'] for c in driver.get_cookies()}
-    except Exception as e:
-        print(f"获取Cookies失败: {str(e)}")
-        return "未知"
-    
-    headers = {
-        'User-Agent': driver.execute_script("return navigator.userAgent;"),
-        'Referer': 'https://weibo.com/',
-        'X-Requested-With': 'XMLHttpRequest'
-    }
-    
-    for attempt in range(API_RETRY):
-        try:
-            time.sleep(random.uniform(*IP_API_DELAY))
-            response = requests.get(
-                api_url,
-                headers=headers,
-                cookies=cookies,
-                timeout=IP_API_TIMEOUT
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                region = data.get("region_name", "")
-                return region.split()[-1] if region else "未知"
-                
-            elif response.status_code == 404:
-                return "已删除"
-                
-            response.raise_for_status()
-            
-        except requests.exceptions.RequestException as e:
-            print(f"API请求失败（尝试{attempt+1}/{API_RETRY}）: {str(e)}")
-            if attempt == API_RETRY - 1:
-                return "未知"
-            
-        except KeyError as e:
-            print(f"JSON解析失败: {str(e)}")
-            return "未知"
-    
-    return "未知"
+def render_job(job_id, live):
+    """展示任务状态和已采集的部分结果"""
+    job = load_job(job_id)
+    active = job["status"] in ACTIVE_STATUSES
+    if active != live:
+        st.rerun()  # 任务开始或结束：整页重跑，切换是否定时刷新
+    render_progress(job)
+    if job["error"]:
+        st.error(f"采集失败: {job['error']}")
 
-def parse_weibo_post(post_element, driver):
-    """解析单条微博内容"""
-    try:
-        # 基础信息
-        content = post_element.find_element(By.CSS_SELECTOR, '.txt').text.strip()
-        
-        # 发布时间
-        publish_time_element = post_element.find_element(By.CSS_SELECTOR, '.from a')
-        publish_time = parse_time(publish_time_element.text.strip())
-        
-        # 获取bid
-        try:
-            href = post_element.find_element(By.CSS_SELECTOR, '.from a').get_attribute('href')
-            bid = href.split('/')[-1].split('?')[0]
-        except Exception as e:
-            print(f"获取bid失败: {str(e)}")
-            bid = None
-        
-        # IP属地获取
-        ip_location = "未知"
-        if bid:
-            ip_location = get_ip_location(bid, driver)
-        
-        # 页面回退方案
-        if ip_location == "未知":
-            try:
-                ip_element = post_element.find_element(By.XPATH, ".//span[contains(text(), 'IP属地')]")
-                ip_location = ip_element.text.split('：')[-1].strip()
-            except NoSuchElementException:
-                pass
+    if active:
+        if st.button("⏹ 停止采集", key=f"cancel_{job_id}"):
+            cancel_job(job_id)
+            st.rerun()
+    elif job["collected"] < job["max_posts"]:
+        if st.button("▶ 从断点继续", key=f"resume_{job_id}"):
+            resume_job(job_id)
+            st.rerun()
 
-        # 互动数据
-        repost_btn = post_element.find_element(By.CSS_SELECTOR, '.card-act li:nth-child(1)').text
-        comment_btn = post_element.find_element(By.CSS_SELECTOR, '.card-act li:nth-child(2)').text
-        like_btn = post_element.find_element(By.CSS_SELECTOR, '.card-act li:nth-child(3)').text
-        
-        # 用户信息
-        user_element = post_element.find_element(By.CSS_SELECTOR, '.name')
-        # user_id = user_element.get_attribute('href').split('/')[-1]
-        user_name = user_element.text
-        
-        return {
-            "review": content,
-            "发布时间": publish_time,
-            "ip": ip_location,
-            "转发数": extract_count(repost_btn),
-            "评论数": extract_count(comment_btn),
-            "点赞数": extract_count(like_btn),
-            # "用户ID": user_id,
-            "用户名": user_name,
-            "采集时间": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-    except Exception as e:
-        print(f"解析异常: {str(e)}")
-        return None
+    table = get_job_table(job_id)
+    if not table.rows:
+        st.info("尚未采集到数据")
+        return
+    with st.expander("📊 数据预览", expanded=True):
+        if active:
+            st.dataframe(table.take(np.arange(max(table.rows - PREVIEW_ROWS, 0), table.rows)),
+                         use_container_width=True)
+        else:
+            show_table(table, key=f"job_{job_id}")
 
-def parse_time(time_str):
-    """处理时间格式"""
-    now = datetime.now()
-    if "刚刚" in time_str:
-        return now.strftime("%Y-%m-%d %H:%M")
-    elif "分钟前" in time_str:
-        mins = int(time_str.replace("分钟前", ""))
-        return (now - timedelta(minutes=mins)).strftime("%Y-%m-%d %H:%M")
-    elif "今天" in time_str:
-        return now.strftime(f"%Y-%m-%d {time_str.split()[-1]}")
-    elif "-" in time_str:
-        return f"{now.year}-{time_str}"
-    else:
-        return time_str
+    if not active:
+        # CSV 只在需要下载时生成
+        if st.button("📄 生成CSV", key=f"csv_{job_id}", use_container_width=True):
+            csv = table.take(np.arange(table.rows)).to_csv(index=False, encoding="utf_8_sig")
+            st.download_button(
+                label="💾 下载CSV",
+                data=csv,
+                file_name=f"weibo_{job['keyword']}_{job['created'][:10].replace('-', '')}.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
 
-def extract_count(text):
-    """提取互动数量"""
-    try:
-        return int(''.join(filter(str.isdigit, text)))
-    except:
-        return 0
+live_job = st.fragment(run_every=2)(render_job)
+static_job = st.fragment(render_job)
 
-def weibo_crawler(driver, keyword, start_date, end_date, max_posts):
-    """核心爬取逻辑"""
-    base_url = "https://s.weibo.com/weibo?q={}"
-    search_url = base_url.format(quote(keyword)) + f"&timescope=custom:{start_date}:{end_date}"
-    
-    collected_data = []
-    page = 1
-    
-    try:
-        while len(collected_data) < max_posts:
-            current_url = f"{search_url}&page={page}"
-            driver.get(current_url)
-            time.sleep(random.uniform(3, 5))
-            
-            try:
-                WebDriverWait(driver, 15).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, ".card-wrap"))
-                )
-            except TimeoutException:
-                print(f"页面 {page} 加载超时")
-                page += 1
-                continue
-            
-            posts = driver.find_elements(By.CSS_SELECTOR, ".card-wrap")
-            if not posts:
-                print("无更多内容")
-                break
-            
-            for post in posts:
-                if len(collected_data) >= max_posts:
-                    break
-                
-                parsed = parse_weibo_post(post, driver)
-                if parsed and parsed not in collected_data:
-                    collected_data.append(parsed)
-            
-            page += 1
-        
-        return collected_data[:max_posts]
-    except Exception as e:
-        print(f"爬取异常: {str(e)}")
-        return collected_data
+def show_job(job_id):
+    """任务进行中时定时轮询，结束后不再自动刷新"""
+    if load_job(job_id)["status"] in ACTIVE_STATUSES:
+        live_job(job_id, True)
+    else:
+        static_job(job_id, False)
 
 def main():
     """Streamlit界面"""
@@ -292,6 +124,9 @@ def main():
     )
     
     st.title("📈 微博舆情数据采集系统")
+
+    # 服务重启后恢复未完成的采集任务
+    resume_jobs()
     
     # 原侧边栏内容整合到主界面
     config_col1, config_col2 = st.columns([3, 2])
@@ -307,6 +142,10 @@ def main():
             end_date = st.date_input("结束日期", datetime.now())
         
         max_posts = st.slider("最大采集数量", 10, 1000, 100, 10)
+        sessions = st.slider("并行浏览器会话数", 1, POOL_SIZE, 1,
+                             help="多个已登录会话同时翻页；会话在任务之间复用，空闲不足时按可用数量采集")
+        engine = st.radio("搜索页解析方式", list(ENGINES), format_func=ENGINES.get, horizontal=True)
+        skip_history = st.checkbox("跳过该关键词以往采集过的微博", value=True)
     
     with config_col2:
         with st.expander("📖 使用说明", expanded=True):
@@ -320,49 +159,45 @@ def main():
             **注意事项：**
             - 首次使用需要配置有效Cookie
             - 大规模采集建议分时段进行
+            - 采集在后台运行，刷新页面不会中断，服务重启后自动从断点继续
             - 结果文件请及时下载保存
             """)
     
     st.markdown("---")
     
     if st.button("🚀 开始采集", use_container_width=True):
-        with st.spinner("数据采集中..."):
-            try:
-                driver = init_webdriver()
-                load_cookies(driver)
-                
-                start_time = time.time()
-                data = weibo_crawler(
-                    driver=driver,
-                    keyword=keyword,
-                    start_date=start_date.strftime("%Y-%m-%d"),
-                    end_date=end_date.strftime("%Y-%m-%d"),
-                    max_posts=max_posts
-                )
-                
-                if data:
-                    df = pd.DataFrame(data)
-                    st.success(f"成功采集 {len(df)} 条数据（耗时：{time.time()-start_time:.1f}秒）")
-                    
-                    with st.expander("📊 数据预览", expanded=True):
-                        st.dataframe(df, use_container_width=True)
-                    
-                    csv = df.to_csv(index=False, encoding="utf_8_sig")
-                    st.download_button(
-                        label="💾 下载CSV",
-                        data=csv,
-                        file_name=f"weibo_{keyword}_{datetime.now().strftime('%Y%m%d')}.csv",
-                        mime="text/csv",
-                        use_container_width=True
-                    )
-                else:
-                    st.warning("未采集到有效数据")
-                
-            except Exception as e:
-                st.error(f"采集失败: {str(e)}")
-            finally:
-                if 'driver' in locals():
-                    driver.quit()
+        # 采集在后台任务中进行，刷新页面或关闭浏览器不会中断
+        job_id = submit_job(
+            keyword=keyword,
+            start_date=start_date.strftime("%Y-%m-%d"),
+            end_date=end_date.strftime("%Y-%m-%d"),
+            max_posts=max_posts,
+            skip_history=skip_history,
+            sessions=sessions,
+            engine=engine
+        )
+        st.session_state.crawl_job_id = job_id
+        st.success(f"采集任务已提交：{job_id}")
+
+    show_engine_benchmark(keyword)
+
+    st.header("采集任务")
+    jobs = list_jobs()
+    if not jobs:
+        st.info("暂无采集任务")
+        return
+
+    job_ids = [job["id"] for job in jobs]
+    current = st.session_state.get("crawl_job_id")
+    selected = st.selectbox(
+        "选择任务",
+        job_ids,
+        index=job_ids.index(current) if current in job_ids else 0,
+        format_func=lambda job_id: next(
+            f"{job['keyword']}（{job['created']}，{STATUS_LABELS.get(job['status'], job['status'])}）"
+            for job in jobs if job["id"] == job_id)
+    )
+    show_job(selected)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,9 +1,10 @@
 import streamlit as st
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-import jieba
-import jieba.analyse
-from mk import check_permissions
+from mk import check_permissions, get_data
+import datetime
+from segment import tokenize_reviews, rank_keywords, dataset_key
+from term_index import TermIndex, emerging_terms
+from wordfreq import term_counts, filter_counts
+from wordcloud_render import render_png, resolve_font
 
 # 使用 st.cache_resource 缓存 CampusWordFilter 类的实例，避免重复初始化
 @st.cache_resource 
@@ -25,13 +26,13 @@ class CampusWordFilter:
     def __init__(self):
         # 核心过滤配置
         self.base_stopwords = load_stopwords("stopwords.txt") 
-        self.sensitive_words = ["广告"]  # 可扩展
+        self.sensitive_words = {"广告"}  # 可扩展
         
         # 重点保留词从文件中读取
-        self.education_keywords = self.load_custom_keywords("custom_dict.txt") 
+        self.education_keywords = set(self.load_custom_keywords("custom_dict.txt"))
                                         # 如果文件不存在，使用默认值
         if not self.education_keywords:  
-            self.education_keywords = ["教学质量", "课程改革", "科研成果", "校园文化"]
+            self.education_keywords = {"教学质量", "课程改革", "科研成果", "校园文化"}
             # 显示提示信息
             st.warning("未找到 `custom_dict.txt` 文件，启用默认的重点保留词。")
 
@@ -44,71 +45,108 @@ class CampusWordFilter:
         except FileNotFoundError:
             return []
 
-    def load_custom_keywords(self, path):
-        try:
-            with open(path, 'r', encoding='utf-8') as f:
-                return [line.strip() for line in f.read().splitlines() 
-                        if line.strip()]
-        except FileNotFoundError:
-            return []
-
-    def filter_text(self, text):
-        # 使用TF-IDF提取教育领域关键词
-        keywords = jieba.analyse.extract_tags(text, 
-                                              topK=50,
-                                              allowPOS=('n', 'ns', 'vn', 'nz'))
-
-        # 双重过滤机制
-        words = [word for word in jieba.cut(text) 
-                 if len(word) > 1
-                 and word not in self.base_stopwords 
-                 and word not in self.sensitive_words 
-                 and word in keywords + self.education_keywords] 
-
-        return " ".join(words)
-
-# 使用 st.cache_data 缓存生成词云的操作，避免重复生成
-@st.cache_data 
-def generate_campus_wordcloud(filtered_text, max_words):
-    if not filtered_text:
+    def word_frequencies(self, token_lists, min_word_length=2):
+        """统计词云词频：全量词频只数一遍，关键词提取和过滤都基于这份词频"""
+        return self.filter_frequencies(term_counts(token_lists), min_word_length)
+
+    def filter_frequencies(self, counts, min_word_length=2):
+        """在已统计好的词频（全量或某个切片）上提取关键词并过滤"""
+        # 使用TF-IDF提取教育领域关键词（基于共享分词结果，不再重新分词）
+        keywords = rank_keywords(counts,
+                                 topK=50,
+                                 allowPOS=('n', 'ns', 'vn', 'nz'))
+
+        # 双重过滤机制（集合查找，只对不重复的词做一次）
+        return filter_counts(counts,
+                             keep=set(keywords) | self.education_keywords,
+                             exclude=self.base_stopwords | self.sensitive_words,
+                             min_length=max(min_word_length, 2))
+
+# 词云渲染为 PNG 并缓存在磁盘上，同样的词频再次查看时直接读取图片
+def generate_campus_wordcloud(frequencies, max_words):
+    if not frequencies:
         st.warning("有效文本内容为空")
         return None
 
+    if resolve_font() is None:
+        st.warning("未找到中文字体，使用默认字体（可将字体放入 assets/fonts 或安装 fonts-noto-cjk）")
     try:
-        # 字体兼容方案（Windows/macOS）
-        font_paths = [
-            "C:/Windows/Fonts/msyh.ttc",   # Windows
-            "/System/Library/Fonts/Supplemental/Songti.ttc"   # macOS
-        ]
-
-        for fp in font_paths:
-            try:
-                wc = WordCloud(
-                    font_path=fp,
-                    width=800,
-                    height=400,
-                    collocations=False,  # 禁用词组重复
-                    background_color='white',
-                    max_words=max_words
-                ).generate(filtered_text)
-                break
-            except FileNotFoundError:
-                continue
-        else:
-            st.warning("未找到系统字体，使用默认字体")
-            wc = WordCloud().generate(filtered_text)
-
-        # 生成专业可视化图形
-        fig, ax = plt.subplots(figsize=(12, 6))
-        ax.imshow(wc, interpolation='bilinear')
-        ax.axis('off') 
-        plt.tight_layout() 
-        return fig
-
+        png, _ = render_png(frequencies, max_words)
+        return png
     except Exception as e:
         st.error(f"生成失败：{str(e)}")
         return None
 
+# 词频索引每个数据集只建一次，切片词云和时段对比都从索引中汇总
+@st.cache_resource(max_entries=4)
+def get_term_index(key, _tokens, _published, _regions):
+    return TermIndex(_tokens, _published, _regions)
+
+def _date_range(value, default):
+    """date_input 选择范围时可能只返回一个日期"""
+    if isinstance(value, datetime.date):
+        return value, value
+    if not value:
+        return default
+    return value[0], value[-1]
+
+def show_slice_clouds(data, processor, min_word_length, max_words):
+    reviews = data['review'].dropna()
+    published = data['发布时间'].loc[reviews.index] if '发布时间' in data else None
+    regions = data['ip'].loc[reviews.index] if 'ip' in data else None
+    key = (dataset_key(reviews),
+           None if published is None else dataset_key(published.astype(str)),
+           None if regions is None else dataset_key(regions.astype(str)))
+    with st.spinner("正在建立词频索引..."):
+        index = get_term_index(key, tokenize_reviews(reviews), published, regions)
+
+    span = index.span()
+    region_counts = index.regions()
+    col1, col2 = st.columns(2)
+    with col1:
+        if span is None:
+            st.info("没有可用的发布时间，只能按地区切片")
+            start, end = None, None
+        else:
+            first, last = span[0].date(), span[1].date()
+            start, end = _date_range(
+                st.date_input("时间范围", value=(first, last), min_value=first, max_value=last,
+                              key="slice_dates"),
+                (first, last))
+    with col2:
+        region = st.selectbox(
+            "IP 属地",
+            [None] + region_counts.index.tolist(),
+            format_func=lambda r: "全部" if r is None else f"{r}（{region_counts[r]} 条）",
+            key="slice_region")
+
+    counts = index.slice_counts(start, end, region)
+    st.caption(f"当前切片共 {index.slice_docs(start, end, region)} 条评论")
+    frequencies = processor.filter_frequencies(index.to_frequencies(counts), min_word_length)
+    wordcloud_png = generate_campus_wordcloud(frequencies, max_words)
+    if wordcloud_png:
+        st.image(wordcloud_png)
+
+    if span is None or not st.checkbox("与另一时段对比（新兴词）", key="slice_compare"):
+        return
+    # 默认与紧邻的前一个等长时段对比
+    length = end - start + datetime.timedelta(days=1)
+    default = (max(start - length, span[0].date()), max(start - datetime.timedelta(days=1), span[0].date()))
+    base_start, base_end = _date_range(
+        st.date_input("对比时段", value=default, min_value=span[0].date(), max_value=span[1].date(),
+                      key="slice_baseline"),
+        default)
+    baseline = index.slice_counts(base_start, base_end, region)
+    mask = index.word_mask(processor.base_stopwords | processor.sensitive_words, max(min_word_length, 2))
+    emerging = emerging_terms(counts, baseline, index.vocabulary, mask)
+    if emerging.empty:
+        st.info("当前时段没有明显增长的词")
+        return
+    st.dataframe(emerging, use_container_width=True, hide_index=True)
+    emerging_png = generate_campus_wordcloud(dict(zip(emerging["词"], emerging["增幅（倍）"])), max_words)
+    if emerging_png:
+        st.image(emerging_png, caption="新兴词（按增幅）")
+
 # 主程序
 def main():
     check_permissions()
@@ -116,12 +154,12 @@ def main():
     # 界面布局优化
     st.header("词云生成")
 
-    if 'data' not in st.session_state: 
+    if st.session_state.get('data') is None: 
         st.warning("请先上传数据文件")
         st.stop()
         return
 
-    data = st.session_state.data 
+    data = get_data(['review', '发布时间', 'ip'])
     if data.empty: 
         st.error("数据集为空")
         return
@@ -150,16 +188,20 @@ def main():
         with st.spinner("正在生成词云集锦图，请稍等..."):
             try:
                 processor = get_campus_word_filter()
-                processed_text = processor.filter_text(" ".join(data['review'].dropna()))
+                tokens = tokenize_reviews(data['review'].dropna())
+                frequencies = processor.word_frequencies(tokens, min_word_length)
 
                 # 生成词云并显示
-                wordcloud_fig = generate_campus_wordcloud(processed_text, max_words)
+                wordcloud_png = generate_campus_wordcloud(frequencies, max_words)
 
-                if wordcloud_fig:
-                    st.pyplot(wordcloud_fig)
+                if wordcloud_png:
+                    st.image(wordcloud_png)
 
             except KeyError:
                 st.error("数据集中缺少'review'字段")
 
+    if 'review' in data and st.toggle("按时间 / 地区切片查看"):
+        show_slice_clouds(data, get_campus_word_filter(), min_word_length, max_words)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
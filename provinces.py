@@ -0,0 +1,107 @@
+"""IP 属地规范化
+
+微博 IP 属地的写法不统一（“广东”“广东省”“中国香港”“美国”“海外”等）。
+这里用一张标准地区表把它们统一为简称，存为固定类别的 category 列：
+- 省级行政区按简称前缀和别名匹配；
+- 海外地区统一为“海外”，空值、“未知”“已删除”统一为“未知”，其余为“其他”。
+匹配只对不重复的取值做一次（并缓存），再按类别编码整体映射。
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+UNKNOWN = "未知"
+OVERSEAS = "海外"
+OTHER = "其他"
+
+# (简称, 地图名称)
+PROVINCES = [
+    ("北京", "北京市"), ("天津", "天津市"), ("河北", "河北省"), ("山西", "山西省"),
+    ("内蒙古", "内蒙古自治区"), ("辽宁", "辽宁省"), ("吉林", "吉林省"), ("黑龙江", "黑龙江省"),
+    ("上海", "上海市"), ("江苏", "江苏省"), ("浙江", "浙江省"), ("安徽", "安徽省"),
+    ("福建", "福建省"), ("江西", "江西省"), ("山东", "山东省"), ("河南", "河南省"),
+    ("湖北", "湖北省"), ("湖南", "湖南省"), ("广东", "广东省"), ("广西", "广西壮族自治区"),
+    ("海南", "海南省"), ("重庆", "重庆市"), ("四川", "四川省"), ("贵州", "贵州省"),
+    ("云南", "云南省"), ("西藏", "西藏自治区"), ("陕西", "陕西省"), ("甘肃", "甘肃省"),
+    ("青海", "青海省"), ("宁夏", "宁夏回族自治区"), ("新疆", "新疆维吾尔自治区"),
+    ("台湾", "台湾省"), ("香港", "香港特别行政区"), ("澳门", "澳门特别行政区"),
+]
+MAP_NAMES = dict(PROVINCES)
+CATEGORIES = [short for short, _ in PROVINCES] + [OVERSEAS, OTHER, UNKNOWN]
+
+ALIASES = {
+    "内蒙": "内蒙古",
+    "黑龙": "黑龙江",
+    "Hong Kong": "香港",
+    "Macau": "澳门",
+    "Macao": "澳门",
+    "Taiwan": "台湾",
+}
+UNKNOWN_VALUES = {"", "未知", "已删除", "nan", "None", "null", "其他地区"}
+OVERSEAS_VALUES = {
+    "海外", "境外", "国外",
+    "美国", "加拿大", "墨西哥", "巴西", "阿根廷", "英国", "法国", "德国", "意大利", "西班牙",
+    "葡萄牙", "荷兰", "比利时", "瑞士", "瑞典", "挪威", "丹麦", "芬兰", "爱尔兰", "奥地利",
+    "俄罗斯", "乌克兰", "波兰", "捷克", "希腊", "土耳其", "以色列", "阿联酋", "沙特阿拉伯",
+    "埃及", "南非", "日本", "韩国", "朝鲜", "蒙古", "新加坡", "马来西亚", "泰国", "越南",
+    "菲律宾", "印度尼西亚", "印度", "巴基斯坦", "柬埔寨", "缅甸", "老挝", "澳大利亚", "新西兰",
+}
+_PREFIXES = ("IP属地：", "IP属地:", "中国")
+
+
+@lru_cache(maxsize=4096)
+def canonical_region(value):
+    """把单个 IP 属地写法映射为标准简称（见 CATEGORIES）"""
+    text = str(value).strip()
+    for prefix in _PREFIXES:
+        if text.startswith(prefix) and len(text) > len(prefix):
+            text = text[len(prefix):].strip()
+    if text in UNKNOWN_VALUES:
+        return UNKNOWN
+    for short, _ in PROVINCES:
+        if text.startswith(short):
+            return short
+    for alias, short in ALIASES.items():
+        if text.startswith(alias):
+            return short
+    if text in OVERSEAS_VALUES or text.split()[0] in OVERSEAS_VALUES:
+        return OVERSEAS
+    return OTHER
+
+
+def is_normalized(values):
+    return isinstance(values.dtype, pd.CategoricalDtype) and list(values.cat.categories) == CATEGORIES
+
+
+def normalize_regions(values):
+    """把 IP 属地列规范化为固定类别的 category Series（保留原索引）
+
+    只对不重复的取值做匹配，已规范化的列直接返回。
+    """
+    values = pd.Series(values)
+    if is_normalized(values):
+        return values
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.values, values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    positions = {category: i for i, category in enumerate(CATEGORIES)}
+    # 最后一位对应缺失值（编码 -1）
+    lookup = np.array([positions[canonical_region(u)] for u in uniques] + [positions[UNKNOWN]],
+                      dtype=np.int8)
+    return pd.Series(pd.Categorical.from_codes(lookup[codes], categories=CATEGORIES),
+                     index=values.index, name=values.name)
+
+
+def region_counts(values):
+    """各地区的条数（从多到少，不含 0），柱状图、饼图、地图共用"""
+    regions = normalize_regions(values)
+    counts = np.bincount(regions.cat.codes.values, minlength=len(CATEGORIES))
+    counts = pd.Series(counts, index=CATEGORIES, name="次数")
+    return counts[counts > 0].sort_values(ascending=False, kind="stable")
+
+
+def map_data(counts):
+    """地图数据：[(地图名称, 条数)]，只含省级行政区"""
+    return [(MAP_NAMES[region], int(count)) for region, count in counts.items() if region in MAP_NAMES]
@@ -0,0 +1,116 @@
+"""情感得分持久化缓存
+
+以「模型版本 + 规范化评论文本」的哈希为键，把情感得分保存在 SQLite 中，
+跨会话、跨上传复用。超过容量上限时按最近使用时间（LRU）淘汰。
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+SCORE_CACHE_DB = "sentiment_cache.db"  # 与 upload_history.db 放在同一目录
+MAX_ENTRIES = 2_000_000
+BATCH_SIZE = 900  # 单条 SQL 的参数个数上限（SQLite 默认 999）
+
+
+def normalize_text(text):
+    """规范化评论文本：合并空白字符（不影响 SnowNLP 的分词结果）"""
+    return " ".join(str(text).split())
+
+
+def text_key(text, model_version):
+    raw = f"{model_version}\n{normalize_text(text)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ScoreCache:
+    """情感得分缓存，hits / misses 为本进程内的命中统计"""
+
+    def __init__(self, path=SCORE_CACHE_DB, model_version="", max_entries=MAX_ENTRIES):
+        self.path = path
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS scores
+                            (key TEXT PRIMARY KEY,
+                             score REAL NOT NULL,
+                             last_used REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_scores_last_used ON scores (last_used)")
+            conn.execute("""CREATE TABLE IF NOT EXISTS stats
+                            (name TEXT PRIMARY KEY, value INTEGER NOT NULL)""")
+            conn.executemany("INSERT OR IGNORE INTO stats VALUES (?, 0)",
+                             [("hits",), ("misses",)])
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_many(self, texts):
+        """批量查询，返回与 texts 对齐的得分列表，未命中为 None"""
+        keys = [text_key(text, self.model_version) for text in texts]
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            for i in range(0, len(unique_keys), BATCH_SIZE):
+                batch = unique_keys[i:i + BATCH_SIZE]
+                marks = ",".join("?" * len(batch))
+                found.update(conn.execute(
+                    f"SELECT key, score FROM scores WHERE key IN ({marks})", batch))
+            # 刷新命中条目的最近使用时间
+            hit_keys = list(found)
+            for i in range(0, len(hit_keys), BATCH_SIZE):
+                batch = hit_keys[i:i + BATCH_SIZE]
+                marks = ",".join("?" * len(batch))
+                conn.execute(f"UPDATE scores SET last_used = ? WHERE key IN ({marks})",
+                             [now] + batch)
+
+            scores = [found.get(key) for key in keys]
+            hits = sum(score is not None for score in scores)
+            misses = len(scores) - hits
+            conn.executemany("UPDATE stats SET value = value + ? WHERE name = ?",
+                             [(hits, "hits"), (misses, "misses")])
+            self.hits += hits
+            self.misses += misses
+        return scores
+
+    def put_many(self, texts, scores):
+        """批量写入得分，写入后按容量上限淘汰最久未使用的条目"""
+        now = time.time()
+        rows = {text_key(text, self.model_version): float(score)
+                for text, score in zip(texts, scores)}
+        with self._lock, self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?)",
+                             [(key, score, now) for key, score in rows.items()])
+            self._evict(conn)
+
+    def _evict(self, conn):
+        count = conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute("""DELETE FROM scores WHERE key IN
+                            (SELECT key FROM scores ORDER BY last_used LIMIT ?)""",
+                         (count - self.max_entries,))
+
+    def stats(self):
+        """返回本进程与累计的命中统计及当前条目数"""
+        with self._connect() as conn:
+            totals = dict(conn.execute("SELECT name, value FROM stats"))
+            entries = conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "total_hits": totals.get("hits", 0),
+            "total_misses": totals.get("misses", 0),
+            "entries": entries,
+        }
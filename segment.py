@@ -0,0 +1,188 @@
+"""评论分词管道
+
+每个数据集的评论只分词一次：结果按评论内容哈希缓存在进程内，
+主题建模、词云生成、情感分析等页面共享同一份分词结果。
+"""
+import hashlib
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import jieba
+import jieba.analyse
+import jieba.posseg
+import pandas as pd
+
+USER_DICT = "custom_dict.txt"
+MAX_CACHED_DATASETS = 4  # 最多缓存的数据集（分词引擎）份数
+
+# 并行分词配置：工作进程数可通过环境变量 SEGMENT_WORKERS 调整
+SEGMENT_WORKERS = int(os.environ.get("SEGMENT_WORKERS", os.cpu_count() or 1))
+SEGMENT_CHUNK_SIZE = 5000  # 每个任务块的评论条数
+PARALLEL_MIN_DOCS = 20000  # 少于该条数时串行分词，避免进程启动开销
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # (数据集哈希, 引擎) -> 与评论对齐的词列表 Series
+_pos_cache = {}  # 词 -> 词性
+_dict_lock = threading.Lock()
+_user_dict_loaded = False
+_user_dict_mtime = None  # 已加载的自定义词典的修改时间（文件不存在时为 None）
+
+
+def _dict_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def load_user_dict(path=USER_DICT):
+    """加载自定义词典，返回已加载词典的修改时间
+
+    词典文件修改后重新加载：先恢复 jieba 的主词典，去掉旧词典中加入的词，再加载新词典。
+    """
+    global _user_dict_loaded, _user_dict_mtime
+    mtime = _dict_mtime(path)
+    if _user_dict_loaded and mtime == _user_dict_mtime:
+        return mtime
+    with _dict_lock:
+        if _user_dict_loaded and mtime == _user_dict_mtime:
+            return mtime
+        if _user_dict_loaded:
+            jieba.dt.initialized = False
+            jieba.dt.user_word_tag_tab = {}
+            jieba.posseg.dt.initialize()  # 重建主词典及词性表
+            _pos_cache.clear()
+        if mtime is not None:
+            jieba.load_userdict(path)
+        _user_dict_mtime = mtime
+        _user_dict_loaded = True
+    return mtime
+
+
+def cut_jieba(text):
+    """jieba 精确模式分词"""
+    load_user_dict()
+    return jieba.lcut(text)
+
+
+def cut_snownlp(text):
+    """SnowNLP 情感模型使用的分词（分词后去除 SnowNLP 停用词）"""
+    from snownlp import normal, seg
+    return normal.filter_stop(seg.seg(text))
+
+
+ENGINES = {
+    "jieba": cut_jieba,
+    "snownlp": cut_snownlp,
+}
+
+
+def _engine_version(engine):
+    """自定义词典变化后 jieba 分词结果随之变化，需要纳入缓存键（取实际加载的词典版本）"""
+    if engine == "jieba":
+        return str(load_user_dict())
+    return ""
+
+
+def dataset_key(reviews):
+    """按评论内容计算数据集哈希（与行索引无关）"""
+    texts = reviews.fillna("").astype(str)
+    row_hashes = pd.util.hash_pandas_object(texts, index=False)
+    return hashlib.sha1(row_hashes.values.tobytes()).hexdigest()
+
+
+def _init_worker(engine, user_dict):
+    """工作进程初始化：提前加载词典，保证与主进程分词结果一致"""
+    if engine == "jieba":
+        load_user_dict(user_dict)
+        jieba.initialize()
+
+
+def _cut_chunk(engine, texts):
+    cut = ENGINES[engine]
+    return [cut(text) for text in texts]
+
+
+def cut_batch(texts, engine="jieba", workers=None, chunk_size=SEGMENT_CHUNK_SIZE):
+    """批量分词：按块分发到进程池并行处理，结果保持输入顺序
+
+    workers 默认取 SEGMENT_WORKERS；文本较少或 workers <= 1 时串行执行。
+    """
+    texts = list(texts)
+    workers = SEGMENT_WORKERS if workers is None else workers
+    if workers <= 1 or len(texts) < PARALLEL_MIN_DOCS:
+        return _cut_chunk(engine, texts)
+
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    # 使用 spawn 启动工作进程，避免在多线程的 Streamlit 进程中 fork
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                             mp_context=context,
+                             initializer=_init_worker,
+                             initargs=(engine, os.path.abspath(USER_DICT))) as pool:
+        results = pool.map(_cut_chunk, [engine] * len(chunks), chunks)
+        return [tokens for chunk in results for tokens in chunk]
+
+
+def tokenize_reviews(reviews, engine="jieba", workers=None):
+    """返回与 reviews 索引对齐的分词结果（每行一个词列表）
+
+    同一数据集重复调用直接命中缓存；数据集内重复的评论也只分词一次。
+    大数据集自动使用多进程分词（见 cut_batch）。
+    返回的词列表在多行之间共享，调用方不要原地修改。
+    """
+    key = (dataset_key(reviews), engine, _engine_version(engine))
+
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+    if cached is not None:
+        return pd.Series(cached.values, index=reviews.index, name="tokens")
+
+    texts = reviews.fillna("").astype(str)
+    codes, uniques = pd.factorize(texts)
+    unique_tokens = cut_batch(uniques, engine, workers)
+    tokens = pd.Series([unique_tokens[code] for code in codes],
+                       index=reviews.index, name="tokens", dtype=object)
+
+    with _lock:
+        _cache[key] = tokens
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_CACHED_DATASETS:
+            _cache.popitem(last=False)
+    return tokens
+
+
+def word_flag(word):
+    """查询词性：优先查词典，未登录词再单独做一次词性标注"""
+    flag = _pos_cache.get(word)
+    if flag is None:
+        flag = jieba.posseg.dt.word_tag_tab.get(word)
+        if flag is None:
+            pairs = list(jieba.posseg.cut(word))
+            flag = pairs[0].flag if len(pairs) == 1 else "x"
+        _pos_cache[word] = flag
+    return flag
+
+
+def rank_keywords(freq, topK=20, allowPOS=()):
+    """按已统计好的词频做 TF-IDF 关键词排序，逻辑同 jieba.analyse.extract_tags"""
+    extractor = jieba.analyse.default_tfidf
+    allowPOS = frozenset(allowPOS)
+    weights = {}
+    for word, count in freq.items():
+        if len(word.strip()) < 2 or word.lower() in extractor.stop_words:
+            continue
+        if allowPOS and word_flag(word) not in allowPOS:
+            continue
+        weights[word] = count
+    total = sum(weights.values())
+    for word in weights:
+        weights[word] *= extractor.idf_freq.get(word, extractor.median_idf) / total
+
+    tags = sorted(weights, key=weights.__getitem__, reverse=True)
+    return tags[:topK] if topK else tags
@@ -0,0 +1,134 @@
+"""情感趋势预聚合
+
+按天、周、月三种粒度和 IP 属地维护情感得分之和、条数和各情感标签的条数。
+新数据到达时只把新增的行累加进去（数据被替换时重建）；趋势图直接读聚合表，
+不再每次渲染都对全部数据做时间解析和 groupby，多年的数据也能即时出图。
+"""
+import numpy as np
+import pandas as pd
+
+LABELS = ["消极", "中性", "积极"]
+UNKNOWN_REGION = "未知"
+ALL_REGIONS = None
+
+# 粒度 -> (Period 频率, 补全日期序列时的频率)
+GRAINS = {
+    "D": ("D", "D"),
+    "W": ("W-SUN", "W-MON"),  # 周一开始的自然周
+    "M": ("M", "MS"),
+}
+GRAIN_NAMES = {"D": "按天", "W": "按周", "M": "按月"}
+VALUE_COLUMNS = ["sum", "count"] + LABELS
+
+
+def auto_grain(start, end):
+    """按时间跨度选择粒度：一年以上按月，一个月以上按周，否则按天"""
+    delta = (end - start).days
+    if delta > 365:
+        return "M"
+    if delta > 30:
+        return "W"
+    return "D"
+
+
+def _row_ids(df):
+    """行标识：内容哈希 + 同内容行的序号，重复行也各自计数"""
+    hashes = pd.util.hash_pandas_object(df[["review", "发布时间", "ip"]].astype(str), index=False)
+    occurrence = hashes.groupby(hashes.values).cumcount()
+    return pd.util.hash_pandas_object(pd.DataFrame({"h": hashes.values, "n": occurrence.values}),
+                                      index=False).values
+
+
+def _signature(df):
+    """数据的快速指纹（行数 + 首尾若干行），未变化时跳过逐行比对"""
+    edges = pd.concat([df.head(64), df.tail(64)])[["review", "发布时间"]].astype(str)
+    return len(df), pd.util.hash_pandas_object(edges, index=False).sum()
+
+
+class SentimentCube:
+    """情感得分的时间 × 地区聚合表（可增量更新）"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        empty_index = pd.MultiIndex.from_arrays([pd.DatetimeIndex([]), pd.Index([], dtype=object)],
+                                                names=["period", "region"])
+        self.tables = {grain: pd.DataFrame(columns=VALUE_COLUMNS, index=empty_index, dtype="float64")
+                       for grain in GRAINS}
+        self._seen = np.array([], dtype=np.uint64)
+        self._signature = None
+        self.rows = 0
+
+    def update(self, df):
+        """累加 df 中尚未计入的行，返回新增行数
+
+        df 需要 发布时间、sentiment、sentiment_label 列，ip 列可选。
+        已计入的行不在 df 中（换了一份数据）时清空后整体重建。
+        """
+        if "发布时间" not in df or df.empty:
+            return 0
+        signature = _signature(df)
+        if signature == self._signature:
+            return 0
+        ids = _row_ids(df.assign(ip=df["ip"] if "ip" in df else UNKNOWN_REGION))
+        new = ~np.isin(ids, self._seen)
+        if len(ids) - new.sum() < self.rows:
+            self.reset()
+            new = np.ones(len(ids), dtype=bool)
+        self._signature = signature
+        if not new.any():
+            return 0
+        self._seen = np.union1d(self._seen, ids[new])
+        self.rows += int(new.sum())
+
+        batch = df.loc[new]
+        published = pd.to_datetime(batch["发布时间"], errors="coerce")
+        valid = published.notna().values & batch["sentiment"].notna().values
+        published = published[valid]
+        if "ip" in batch:
+            regions = batch["ip"].astype(object).fillna(UNKNOWN_REGION).astype(str).values[valid]
+        else:
+            regions = np.full(valid.sum(), UNKNOWN_REGION, dtype=object)
+        labels = pd.Categorical(batch["sentiment_label"].values[valid], categories=LABELS)
+        values = pd.DataFrame({"sum": batch["sentiment"].values[valid], "count": 1.0})
+        values = values.join(pd.get_dummies(labels).astype("float64").reset_index(drop=True))
+
+        for grain, (period_freq, _) in GRAINS.items():
+            periods = published.dt.to_period(period_freq).dt.start_time.values
+            partial = values.groupby([periods, regions]).sum()
+            partial.index.names = ["period", "region"]
+            self.tables[grain] = self.tables[grain].add(partial, fill_value=0)
+        return int(new.sum())
+
+    @property
+    def regions(self):
+        """出现过的 IP 属地（按条数从多到少）"""
+        counts = self.tables["M"].groupby(level="region")["count"].sum()
+        return counts.sort_values(ascending=False).index.tolist()
+
+    def span(self):
+        """数据的起止日期，无数据时返回 None"""
+        periods = self.tables["D"].index.get_level_values("period")
+        if len(periods) == 0:
+            return None
+        return periods.min(), periods.max()
+
+    def trend(self, grain="D", region=ALL_REGIONS):
+        """按粒度返回连续时间序列：平均得分、条数和各标签条数（空缺时段记 0）"""
+        table = self.tables[grain]
+        if region is ALL_REGIONS:
+            table = table.groupby(level="period").sum()
+        elif region in table.index.get_level_values("region"):
+            table = table.xs(region, level="region")
+        else:
+            return pd.DataFrame(columns=["sentiment"] + VALUE_COLUMNS[1:])
+        if table.empty:
+            return pd.DataFrame(columns=["sentiment"] + VALUE_COLUMNS[1:])
+
+        full_range = pd.date_range(table.index.min(), table.index.max(), freq=GRAINS[grain][1])
+        table = table.reindex(full_range, fill_value=0)
+        trend = pd.DataFrame({"sentiment": (table["sum"] / table["count"]).fillna(0)}, index=full_range)
+        for column in VALUE_COLUMNS[1:]:
+            trend[column] = table[column].astype("int64")
+        return trend
@@ -0,0 +1,119 @@
+"""分时段 / 分地区词频索引
+
+每个数据集只建一次：把分词结果按「发布日期 × IP 属地」汇总为稀疏的单元格 × 词计数矩阵。
+任意日期范围和地区的词频只需把对应单元格的行相加，
+两个时段的对比（新出现、增长最快的词）也只是两条词频向量的运算，不必重新分词和过滤。
+"""
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from provinces import CATEGORIES, normalize_regions
+
+SMOOTHING = 0.5  # 计算增幅时的加一平滑系数
+
+
+class TermIndex:
+    """日期 × 地区 × 词的计数索引
+
+    token_lists 为与数据行对齐的分词结果，published 为发布时间，regions 为 IP 属地。
+    发布时间无法解析的评论不计入任何时段，但仍计入全量和按地区的统计。
+    """
+
+    def __init__(self, token_lists, published=None, regions=None):
+        token_lists = list(token_lists)
+        n_docs = len(token_lists)
+        lengths = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=n_docs)
+        flat = pd.Series(list(chain.from_iterable(token_lists)), dtype=object)
+        term_codes, vocabulary = pd.factorize(flat)
+        self.vocabulary = np.asarray(vocabulary, dtype=object)
+
+        if published is None:
+            published = pd.Series(pd.NaT, index=range(n_docs))
+        days = pd.to_datetime(pd.Series(published).reset_index(drop=True), errors="coerce").dt.normalize()
+        day_codes, day_values = pd.factorize(days, sort=True)
+        day_codes = np.where(day_codes < 0, len(day_values), day_codes)  # 无效时间单独成一组
+        day_values = np.append(day_values.values, np.datetime64("NaT"))
+
+        if regions is None:
+            regions = pd.Series([None] * n_docs)
+        region_codes = normalize_regions(regions).cat.codes.values.astype(np.int64)
+
+        # 单元格 = (日期, 地区)，只保留实际出现的组合
+        cell_codes, cells = pd.factorize(day_codes * len(CATEGORIES) + region_codes)
+        self.cell_dates = day_values[cells // len(CATEGORIES)]
+        self.cell_regions = cells % len(CATEGORIES)
+        self.matrix = csr_matrix(
+            (np.ones(len(term_codes), dtype=np.int32), (np.repeat(cell_codes, lengths), term_codes)),
+            shape=(len(cells), len(self.vocabulary)),
+        )
+        self.cell_docs = np.bincount(cell_codes, minlength=len(cells))
+
+    def span(self):
+        """有效发布时间的起止日期，没有时返回 None"""
+        dates = self.cell_dates[~np.isnat(self.cell_dates)]
+        if dates.size == 0:
+            return None
+        return pd.Timestamp(dates.min()), pd.Timestamp(dates.max())
+
+    def regions(self):
+        """出现过的地区及评论数（从多到少）"""
+        counts = np.bincount(self.cell_regions, weights=self.cell_docs, minlength=len(CATEGORIES))
+        counts = pd.Series(counts.astype(np.int64), index=CATEGORIES)
+        return counts[counts > 0].sort_values(ascending=False, kind="stable")
+
+    def _cells(self, start=None, end=None, region=None):
+        mask = np.ones(len(self.cell_dates), dtype=bool)
+        if start is not None:
+            mask &= self.cell_dates >= np.datetime64(pd.Timestamp(start).normalize())
+        if end is not None:
+            mask &= self.cell_dates <= np.datetime64(pd.Timestamp(end).normalize())
+        if region is not None:
+            mask &= self.cell_regions == CATEGORIES.index(region)
+        return mask
+
+    def slice_counts(self, start=None, end=None, region=None):
+        """某个日期范围（含首尾）和地区的词频向量，参数为 None 表示不限"""
+        mask = self._cells(start, end, region)
+        return np.asarray(mask.astype(np.int32) @ self.matrix).ravel()
+
+    def slice_docs(self, start=None, end=None, region=None):
+        """切片内的评论数"""
+        return int(self.cell_docs[self._cells(start, end, region)].sum())
+
+    def to_frequencies(self, counts):
+        """词频向量转为 {词: 次数}，只含出现过的词"""
+        positions = np.flatnonzero(counts)
+        return dict(zip(self.vocabulary[positions].tolist(), counts[positions].tolist()))
+
+    def word_mask(self, exclude=frozenset(), min_length=1):
+        """可参与统计的词：不在 exclude 中且不短于 min_length"""
+        words = pd.Series(self.vocabulary)
+        return (words.str.len() >= min_length).values & ~words.isin(exclude).values
+
+
+def emerging_terms(current, baseline, vocabulary, mask=None, top_n=20, min_count=3):
+    """当前时段相对对比时段增长最快的词
+
+    按平滑后的词频占比之比排序，只考虑当前时段出现至少 min_count 次的词。
+    返回 DataFrame：词、当前次数、对比次数、增幅（倍）。
+    """
+    current = np.asarray(current, dtype=np.float64)
+    baseline = np.asarray(baseline, dtype=np.float64)
+    if mask is None:
+        mask = np.ones(len(vocabulary), dtype=bool)
+    size = mask.sum()
+    current_share = (current + SMOOTHING) / (current[mask].sum() + SMOOTHING * size)
+    baseline_share = (baseline + SMOOTHING) / (baseline[mask].sum() + SMOOTHING * size)
+    ratio = current_share / baseline_share
+
+    candidates = np.flatnonzero(mask & (current >= min_count))
+    top = candidates[np.argsort(-ratio[candidates], kind="stable")[:top_n]]
+    return pd.DataFrame({
+        "词": vocabulary[top],
+        "当前次数": current[top].astype(np.int64),
+        "对比次数": baseline[top].astype(np.int64),
+        "增幅（倍）": np.round(ratio[top], 2),
+    })
@@ -0,0 +1,53 @@
+"""html_engine.parse_search_page 对保存下来的搜索结果页的解析"""
+import os
+
+import pytest
+
+from html_engine import parse_search_page
+from ip_fetcher import UNKNOWN
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture(scope="module")
+def search_page():
+    return parse_search_page(read_fixture("search_page.html"))
+
+
+def test_parses_every_card_wrap(search_page):
+    assert len(search_page) == 3
+
+
+def test_post_with_ip(search_page):
+    assert search_page[0] == {
+        "bid": "PabcDEF12",
+        "content": "#海南自贸港# 全岛封关运作倒计时，\n加工增值免关税政策 持续释放红利",
+        "time_text": "10月17日 12:30",
+        "page_ip": "海南",
+        "actions": ["转发 12", "评论 3", "1.2万"],
+        "user_name": "海口日报",
+    }
+
+
+def test_post_without_ip_span(search_page):
+    assert search_page[1] == {
+        "bid": "PxyZ0987",
+        "content": "去海口免税店逛了一圈",
+        "time_text": "2023年12月31日 23:59",
+        "page_ip": UNKNOWN,
+        "actions": ["转发", "评论", "赞"],
+        "user_name": "椰城小记",
+    }
+
+
+def test_non_post_card_is_none(search_page):
+    assert search_page[2] is None
+
+
+def test_no_result_page():
+    assert parse_search_page(read_fixture("search_no_result.html")) == [None]
@@ -0,0 +1,71 @@
+"""topic_models.fit_or_update 对 KMeans 模型的增量更新"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import topic_models
+from features import FeatureStore
+
+N_CLUSTERS = 5
+
+
+def make_docs(n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.Series([" ".join(f"w{rng.integers(0, 60)}" for _ in range(10)) for _ in range(n)])
+
+
+@pytest.fixture
+def trained(tmp_path, monkeypatch):
+    monkeypatch.setattr(topic_models, "MODEL_DIR", str(tmp_path))
+    docs = make_docs(1000, seed=0)
+    topic_model = topic_models.fit_or_update(FeatureStore(docs), "kmeans", N_CLUSTERS)
+    assert topic_model.status == "trained"
+    return docs, topic_model
+
+
+def expected_centers(topic_model, store, new_rows):
+    """全部文档的簇均值：原中心按原文档数加权，再加上新文档"""
+    centers = topic_model.model.cluster_centers_.copy()
+    counts = topic_model.counts.copy()
+    X_new = topic_model.transform(store, new_rows)
+    labels = topic_model.model.predict(X_new)
+    for cluster in range(N_CLUSTERS):
+        picked = X_new[labels == cluster]
+        if picked.shape[0]:
+            total = counts[cluster] + picked.shape[0]
+            centers[cluster] = (centers[cluster] * counts[cluster] + picked.sum(axis=0).A1) / total
+            counts[cluster] = total
+    return centers, counts
+
+
+@pytest.mark.parametrize("added", [1, N_CLUSTERS - 1, 20])
+def test_kmeans_update_weights_existing_centers(trained, added):
+    docs, topic_model = trained
+    grown = pd.concat([docs, make_docs(added, seed=1)], ignore_index=True)
+    store = FeatureStore(grown)
+    centers, counts = expected_centers(topic_model, store, np.arange(len(docs), len(grown)))
+
+    updated = topic_models.fit_or_update(store, "kmeans", N_CLUSTERS)
+
+    assert updated.status == "updated"
+    assert updated.counts.sum() == len(grown)
+    np.testing.assert_array_equal(updated.counts, counts)
+    np.testing.assert_allclose(updated.model.cluster_centers_, centers, rtol=1e-5)
+
+
+def test_kmeans_update_keeps_history(trained):
+    docs, topic_model = trained
+    before = topic_model.model.cluster_centers_.copy()
+    grown = pd.concat([docs, make_docs(20, seed=1)], ignore_index=True)
+    store = FeatureStore(grown)
+    new_rows = np.arange(len(docs), len(grown))
+
+    updated = topic_models.fit_or_update(store, "kmeans", N_CLUSTERS)
+
+    # 20 篇新文档只让中心小幅移动，而不是变成新文档的均值
+    X_new = updated.transform(store, new_rows)
+    labels = updated.model.predict(X_new)
+    for cluster in np.unique(labels):
+        new_mean = X_new[labels == cluster].mean(axis=0).A1
+        assert not np.allclose(updated.model.cluster_centers_[cluster], new_mean, atol=1e-6)
+    assert np.abs(updated.model.cluster_centers_ - before).max() < 0.05
@@ -0,0 +1,61 @@
+"""文档主题推断与主题趋势汇总
+
+分块计算每篇文档的主题分布（lda.transform），得到主导主题及其概率，
+并预先汇总为“日期 × 主题”“地区 × 主题”的小表。趋势图和地区分布图
+只需按主题取列，不必每次对全量数据做 groupby。
+"""
+import numpy as np
+import pandas as pd
+
+INFERENCE_CHUNK_SIZE = 5000
+UNKNOWN_REGION = "未知"
+
+
+def document_topics(lda, X, chunk_size=INFERENCE_CHUNK_SIZE):
+    """分块计算文档 × 主题分布（float32），避免一次性推断占用过多内存"""
+    doc_topic = np.empty((X.shape[0], lda.n_components), dtype=np.float32)
+    for start in range(0, X.shape[0], chunk_size):
+        stop = start + chunk_size
+        doc_topic[start:stop] = lda.transform(X[start:stop])
+    return doc_topic
+
+
+def _topic_table(keys, topics, num_topics):
+    """按 keys 分组统计各主题文档数，返回 keys × 主题的宽表（缺失记为 0）"""
+    codes, uniques = pd.factorize(keys, sort=True)
+    valid = codes >= 0
+    flat = codes[valid].astype(np.int64) * num_topics + topics[valid]
+    counts = np.bincount(flat, minlength=len(uniques) * num_topics)
+    return pd.DataFrame(counts.reshape(len(uniques), num_topics).astype(np.int32),
+                        index=uniques, columns=range(num_topics))
+
+
+class TopicAssignments:
+    """一个数据集在某个 LDA 模型下的文档主题归属及预汇总表
+
+    frame：与数据行对齐的主导主题（从 0 开始）和概率；
+    by_day：日期 × 主题的文档数；by_region：IP 属地 × 主题的文档数。
+    """
+
+    def __init__(self, lda, X, published=None, regions=None, chunk_size=INFERENCE_CHUNK_SIZE):
+        self.num_topics = lda.n_components
+        self.doc_topic = document_topics(lda, X, chunk_size)
+        dominant = self.doc_topic.argmax(axis=1).astype(np.int16)
+        self.frame = pd.DataFrame({
+            "主题": dominant,
+            "主题概率": self.doc_topic[np.arange(len(dominant)), dominant],
+        })
+
+        self.by_day = None
+        if published is not None:
+            days = pd.to_datetime(pd.Series(published).reset_index(drop=True), errors="coerce").dt.normalize()
+            self.by_day = _topic_table(days.values, dominant, self.num_topics)
+
+        self.by_region = None
+        if regions is not None:
+            regions = pd.Series(regions).reset_index(drop=True).astype(object).fillna(UNKNOWN_REGION).astype(str)
+            self.by_region = _topic_table(regions.values, dominant, self.num_topics)
+
+    def topic_sizes(self):
+        """各主题的文档数"""
+        return np.bincount(self.frame["主题"], minlength=self.num_topics)
@@ -0,0 +1,216 @@
+"""主题模型的持久化与增量更新
+
+训练好的 LDA / KMeans 模型连同词表和 idf 按参数保存到 models/ 目录，
+并记录已参与训练的文档哈希：
+- 同一份数据、同一组参数再次打开时直接复用，不再重新训练；
+- 数据增长（新上传或新采集）时只用新增文档更新模型：
+  LDA 用在线变分 partial_fit，KMeans 按各簇已有文档数对聚类中心做加权更新；
+- 新增文档过多时词表已明显过时，改为整体重新训练；
+- 已训练的文档大多不在当前数据中时视为另一份数据，单独训练并保存，不覆盖原有模型。
+特征矩阵来自 features.FeatureStore，不再为每个模型单独向量化。
+"""
+import glob
+import hashlib
+import os
+
+import joblib
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+from sklearn.cluster import KMeans
+from sklearn.decomposition import LatentDirichletAllocation
+
+MODEL_DIR = "models"
+MAX_MODELS = 20  # 磁盘上最多保留的模型文件数，超出时删除最久未使用的
+REFIT_RATIO = 0.5  # 新增文档数超过已训练文档数的该比例时整体重新训练
+CONTAIN_RATIO = 0.9  # 已训练文档至少有该比例仍在当前数据中，才视为同一份数据的增长
+UPDATE_BATCH_SIZE = 1024
+
+
+def params_key(method, n_components, max_df, min_df):
+    """同一组参数的模型文件名前缀：方法 + 参数"""
+    params = f"{method}|{n_components}|{max_df:.4f}|{min_df}"
+    return f"{method}-{n_components}-" + hashlib.sha1(params.encode("utf-8")).hexdigest()[:12]
+
+
+def model_key(method, n_components, max_df, min_df, lineage):
+    """模型文件名：参数 + 首次训练所用数据的标识"""
+    return f"{params_key(method, n_components, max_df, min_df)}-{lineage}"
+
+
+def corpus_id(hashes):
+    """一组文档哈希的标识（与顺序、重复无关）"""
+    return hashlib.sha1(np.unique(hashes).tobytes()).hexdigest()[:12]
+
+
+def train_lda(X, num_topics):
+    """训练 LDA 模型"""
+    lda = LatentDirichletAllocation(n_components=num_topics, random_state=42)
+    lda.fit(X)
+    return lda
+
+
+def train_kmeans(X, num_clusters):
+    """训练 KMeans 模型"""
+    kmeans = KMeans(n_clusters=num_clusters, random_state=42)
+    kmeans.fit(X)
+    return kmeans
+
+
+def update_lda(lda, X_new, total_samples):
+    """用新增文档在线更新 LDA"""
+    lda.set_params(total_samples=total_samples)
+    for start in range(0, X_new.shape[0], UPDATE_BATCH_SIZE):
+        lda.partial_fit(X_new[start:start + UPDATE_BATCH_SIZE])
+    return lda
+
+
+def cluster_sizes(kmeans):
+    """各簇的训练文档数"""
+    return np.bincount(kmeans.labels_, minlength=kmeans.n_clusters)
+
+
+def update_kmeans(kmeans, X_new, counts):
+    """把新增文档分到最近的簇，按文档数加权更新聚类中心，返回各簇更新后的文档数
+
+    新中心 = (原中心 × 原文档数 + 新文档之和) / 总文档数，即把新文档并入各簇的均值，
+    已有的训练结果不会被少量新文档覆盖；新增文档少于簇数时同样适用。
+    """
+    centers = kmeans.cluster_centers_
+    labels = kmeans.predict(X_new)
+    assign = csr_matrix((np.ones(len(labels)), (labels, np.arange(len(labels)))),
+                        shape=(len(centers), X_new.shape[0]))
+    sums = assign @ X_new
+    if issparse(sums):
+        sums = sums.toarray()
+    total = counts + np.bincount(labels, minlength=len(centers))
+    updated = total > 0
+    centers = centers.copy()
+    centers[updated] = (centers[updated] * counts[updated, None] + sums[updated]) / total[updated, None]
+    kmeans.cluster_centers_ = centers
+    return total
+
+
+class TopicModel:
+    """一个已训练的模型及其词表、idf 和训练文档记录"""
+
+    def __init__(self, method, n_components, max_df, min_df, features, idf, model, seen, lineage):
+        self.method = method
+        self.n_components = n_components
+        self.max_df = max_df
+        self.min_df = min_df
+        self.features = features
+        self.idf = idf
+        self.model = model
+        self.seen = np.sort(seen)  # 已参与训练的文档哈希
+        self.lineage = lineage  # 首次训练所用数据的标识，增量更新后不变
+        self.counts = cluster_sizes(model) if method == "kmeans" else None  # KMeans 各簇的文档数
+        self.status = "trained"  # 本次加载的方式：trained / updated / cached
+
+    @property
+    def key(self):
+        return model_key(self.method, self.n_components, self.max_df, self.min_df, self.lineage)
+
+    def transform(self, store, rows=None):
+        """按模型的词表计算 store 中文档的 TF-IDF 矩阵"""
+        return store.project(self.features, self.idf, rows)
+
+
+def _model_path(key):
+    return os.path.join(MODEL_DIR, f"{key}.joblib")
+
+
+def load_model(path):
+    """读取已保存的模型，不存在或文件损坏时返回 None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        model = joblib.load(path)
+    except Exception as e:
+        print(f"模型文件读取失败，将重新训练: {str(e)}")
+        return None
+    if not isinstance(model, TopicModel) or not hasattr(model, "counts"):
+        return None  # 旧格式
+    return model
+
+
+def find_model(hashes, method, n_components, max_df, min_df):
+    """在同一组参数的已保存模型中，找出已训练文档被当前数据覆盖得最多的一个
+
+    当前文档全部训练过的模型直接可用；否则覆盖比例低于 CONTAIN_RATIO 时说明是另一份数据，返回 None。
+    """
+    pattern = os.path.join(MODEL_DIR, f"{params_key(method, n_components, max_df, min_df)}-*.joblib")
+    best, best_ratio = None, CONTAIN_RATIO
+    for path in sorted(glob.glob(pattern), key=os.path.getmtime, reverse=True):
+        topic_model = load_model(path)
+        if topic_model is None or len(topic_model.seen) == 0:
+            continue
+        covered = np.isin(hashes, topic_model.seen).all()
+        ratio = 1.0 if covered else np.isin(topic_model.seen, hashes).mean()
+        if ratio >= best_ratio:
+            best, best_ratio = topic_model, ratio
+            if ratio == 1:
+                break
+    if best is not None:
+        os.utime(_model_path(best.key))
+    return best
+
+
+def save_model(topic_model):
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    path = _model_path(topic_model.key)
+    tmp_path = path + ".tmp"
+    joblib.dump(topic_model, tmp_path)
+    os.replace(tmp_path, path)
+
+    files = sorted(glob.glob(os.path.join(MODEL_DIR, "*.joblib")), key=os.path.getmtime)
+    for stale in files[:-MAX_MODELS]:
+        os.remove(stale)
+
+
+def _train(method, X, n_components):
+    return train_lda(X, n_components) if method == "lda" else train_kmeans(X, n_components)
+
+
+def fit_or_update(store, method, n_components, max_df=0.95, min_df=2, refit=False):
+    """取得与当前数据对应的模型
+
+    store 为当前数据集的 FeatureStore，method 为 "lda" 或 "kmeans"。
+    已保存的模型覆盖了全部文档时直接复用；有新增文档时增量更新；
+    没有可用模型（已训练文档大多不在当前数据中）、新增文档过多或 refit=True 时整体训练。返回 TopicModel，
+    其 status 属性说明本次是训练、更新还是复用。
+    """
+    hashes = store.doc_hashes
+    topic_model = None if refit else find_model(hashes, method, n_components, max_df, min_df)
+
+    if topic_model is not None:
+        new_mask = ~np.isin(hashes, topic_model.seen)
+        new_count = int(np.unique(hashes[new_mask]).size)
+        if new_count == 0:
+            topic_model.status = "cached"
+            return topic_model
+        if new_count <= len(topic_model.seen) * REFIT_RATIO:
+            X_new = topic_model.transform(store, np.flatnonzero(new_mask))
+            if method == "lda":
+                update_lda(topic_model.model, X_new, total_samples=len(hashes))
+            else:
+                topic_model.counts = update_kmeans(topic_model.model, X_new, topic_model.counts)
+            topic_model.seen = np.union1d(topic_model.seen, hashes)
+            topic_model.status = "updated"
+            save_model(topic_model)
+            return topic_model
+
+    X, features, idf = store.tfidf(max_df, min_df)
+    model = _train(method, X, n_components)
+    topic_model = TopicModel(method, n_components, max_df, min_df, features, idf, model,
+                             np.unique(hashes), corpus_id(hashes))
+    save_model(topic_model)
+    return topic_model
+
+
+def adopt_model(store, method, n_components, max_df, min_df, model):
+    """把在 store 全部文档上训练好的模型（如自动调参选出的模型）保存为对应参数的模型"""
+    _, features, idf = store.tfidf(max_df, min_df)
+    topic_model = TopicModel(method, n_components, max_df, min_df, features, idf, model,
+                             np.unique(store.doc_hashes), corpus_id(store.doc_hashes))
+    save_model(topic_model)
+    return topic_model
@@ -0,0 +1,133 @@
+"""词云图片渲染与缓存
+
+词云直接渲染为 PNG 字节（不经过 matplotlib 重新栅格化），
+以「词频表摘要 + 最大词数 + 尺寸 + 字体标识」为键保存在磁盘缓存中，
+同样的词频再次查看时直接读文件，不再重新排版。缓存文件数超过上限时按最近使用时间淘汰。
+
+中文字体只在首次使用时查找一次，依次尝试：
+assets/fonts 下随项目提供的字体、Linux 常见中文字体（部署时通过 packages.txt 安装 fonts-noto-cjk）、
+fc-match 的结果、Windows / macOS 系统字体。
+"""
+import glob
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+from functools import lru_cache
+
+from wordcloud import WordCloud
+
+WORDCLOUD_CACHE_DIR = "wordcloud_cache"
+MAX_CACHED_IMAGES = 200
+WIDTH, HEIGHT = 800, 400
+
+FONT_DIR = os.path.join("assets", "fonts")
+LINUX_FONTS = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",  # fonts-noto-cjk
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+]
+DESKTOP_FONTS = [
+    "C:/Windows/Fonts/msyh.ttc",  # Windows
+    "/System/Library/Fonts/Supplemental/Songti.ttc",  # macOS
+]
+
+
+def _fc_match():
+    """用 fontconfig 查找支持中文的字体，没有 fc-match 时返回 None"""
+    if shutil.which("fc-match") is None:
+        return None
+    try:
+        result = subprocess.run(["fc-match", "-f", "%{file}", "sans-serif:lang=zh-cn"],
+                                capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    path = result.stdout.strip()
+    return path if path and os.path.exists(path) else None
+
+
+@lru_cache(maxsize=None)
+def resolve_font():
+    """查找可用的中文字体路径（进程内只查找一次），找不到时返回 None"""
+    bundled = sorted(glob.glob(os.path.join(FONT_DIR, "*.tt[fc]")) + glob.glob(os.path.join(FONT_DIR, "*.otf")))
+    for path in bundled + LINUX_FONTS:
+        if os.path.exists(path):
+            return path
+    path = _fc_match()
+    if path is not None:
+        return path
+    for path in DESKTOP_FONTS:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def font_id(font_path):
+    """字体标识：文件名 + 大小，字体换了缓存随之失效"""
+    if font_path is None:
+        return "default"
+    return f"{os.path.basename(font_path)}:{os.path.getsize(font_path)}"
+
+
+def frequency_digest(frequencies):
+    """词频表的摘要（与字典顺序无关）"""
+    items = sorted(frequencies.items())
+    return hashlib.sha1(json.dumps(items, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def cache_key(frequencies, max_words, width=WIDTH, height=HEIGHT, font_path=None):
+    raw = f"{frequency_digest(frequencies)}|{max_words}|{width}x{height}|{font_id(font_path)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(WORDCLOUD_CACHE_DIR, f"{key}.png")
+
+
+def _evict():
+    files = sorted(glob.glob(os.path.join(WORDCLOUD_CACHE_DIR, "*.png")), key=os.path.getmtime)
+    for stale in files[:-MAX_CACHED_IMAGES]:
+        try:
+            os.remove(stale)
+        except FileNotFoundError:
+            pass
+
+
+def render_png(frequencies, max_words, width=WIDTH, height=HEIGHT):
+    """把词频渲染为 PNG 字节，命中磁盘缓存时直接返回文件内容
+
+    返回 (PNG 字节, 是否命中缓存)。
+    """
+    font_path = resolve_font()
+    path = _cache_path(cache_key(frequencies, max_words, width, height, font_path))
+    try:
+        with open(path, "rb") as f:
+            png = f.read()
+        os.utime(path)  # 记录最近使用时间，供淘汰时参考
+        return png, True
+    except FileNotFoundError:
+        pass
+
+    wc = WordCloud(
+        font_path=font_path,
+        width=width,
+        height=height,
+        collocations=False,  # 禁用词组重复
+        background_color="white",
+        max_words=max_words,
+    ).generate_from_frequencies(frequencies)
+    buffer = io.BytesIO()
+    wc.to_image().save(buffer, format="PNG", optimize=True)
+    png = buffer.getvalue()
+
+    os.makedirs(WORDCLOUD_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(png)
+    os.replace(tmp_path, path)
+    _evict()
+    return png, False
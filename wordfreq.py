@@ -0,0 +1,39 @@
+"""词云词频统计
+
+不再把全部评论拼成一个大字符串再交给词云重新分词：
+直接在共享的分词结果上逐块计数（Counter 的计数在 C 层完成），各块结果合并后，
+过滤只对不重复的词做一次集合查找，得到的词频交给 WordCloud.generate_from_frequencies。
+内存只与词表大小和块大小有关，不随评论总字数增长。
+"""
+from collections import Counter
+from itertools import chain, islice
+
+FREQ_CHUNK_SIZE = 10000  # 每块的评论条数
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def term_counts(token_lists, chunk_size=FREQ_CHUNK_SIZE):
+    """逐块统计所有词的出现次数并合并"""
+    total = Counter()
+    for chunk in _chunks(token_lists, chunk_size):
+        total.update(Counter(chain.from_iterable(chunk)))
+    return total
+
+
+def filter_counts(counts, keep=None, exclude=frozenset(), min_length=1):
+    """按词表过滤词频：keep 不为空时只保留其中的词，exclude 中的词和短于 min_length 的词去掉"""
+    return {
+        word: count for word, count in counts.items()
+        if len(word) >= min_length
+        and word not in exclude
+        and (keep is None or word in keep)
+    }
+